@@ -0,0 +1,126 @@
+"""
+Helpers shared by the benchmark modes of test.py: timing, summary statistics and result files.
+"""
+import csv
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+
+def timed(fn, *args, **kwargs):
+    """
+    Returns (elapsed seconds, result of fn).
+    """
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def wait_for(fn, timeout, interval=0.1):
+    """
+    Poll fn until it returns a non-None value, returns (elapsed seconds, value).
+    Raises TimeoutError if timeout (in seconds) is reached.
+    """
+    start = time.perf_counter()
+    while True:
+        value = fn()
+        elapsed = time.perf_counter() - start
+        if value is not None:
+            return elapsed, value
+        if elapsed > timeout:
+            raise TimeoutError(f"No result after {timeout} seconds")
+        time.sleep(interval)
+
+
+def percentile(values, q) -> float:
+    """
+    Nearest-rank percentile, q in [0, 100].
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies) -> dict:
+    """
+    Summary (in milliseconds) of a list of latencies given in seconds.
+    """
+    if not latencies:
+        return {"samples": 0}
+    return {
+        "samples": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+class RollingStats:
+    """
+    Latency and availability over the last `window` samples of each named step.
+    Memory is bounded by window * number of names, whatever the run length.
+    """
+
+    def __init__(self, window=100):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.totals = {}
+
+    def record(self, name, seconds, ok=True) -> None:
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+                self.totals[name] = [0, 0]
+            self.samples[name].append((seconds, ok))
+            self.totals[name][0] += 1
+            self.totals[name][1] += 0 if ok else 1
+
+    def summary(self, prefix="") -> dict:
+        """
+        name -> latency summary (of successful samples) and availability of the window, plus lifetime counts.
+        """
+        with self.lock:
+            snapshot = {n: (list(s), tuple(self.totals[n])) for n, s in self.samples.items() if n.startswith(prefix)}
+        stats = {}
+        for name, (samples, (total, failed)) in sorted(snapshot.items()):
+            stats[name] = {
+                **summarize([seconds for seconds, ok in samples if ok]),
+                "availability": round(sum(ok for _, ok in samples) / len(samples), 4),
+                "total": total,
+                "failed": failed,
+            }
+        return stats
+
+
+def rss_bytes(pid="self") -> int:
+    """
+    Current resident set size of a process (this one by default, Linux only), 0 if unknown.
+    """
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def write_results(rows, path_prefix) -> tuple:
+    """
+    Write rows (list of flat dicts) to '<path_prefix>.csv' and '<path_prefix>.json'.
+    """
+    columns = []
+    for row in rows:
+        columns.extend(k for k in row if k not in columns)
+    csv_path, json_path = f"{path_prefix}.csv", f"{path_prefix}.json"
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(json_path, 'w') as f:
+        json.dump(rows, f, indent=2)
+    return csv_path, json_path
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Parallel, checkpointed block & transaction integrity crawler.
+
+Scans a block range of every shard (or of the given ones) in batches of consecutive blocks. Each batch costs
+two batched JSON-RPC requests:
+  1. hmy_getBlockByNumber (with transactions) and hmy_getBlockTransactionCountByNumber of every block,
+     plus the header of the block before the batch,
+  2. hmy_getBlockTransactionCountByHash of every block and hmy_getTransactionByBlockNumberAndIndex of
+     every transaction found in the bodies,
+and checks that:
+  - the block numbers and parent hashes chain up,
+  - the transaction count by number, by hash and of the body agree,
+  - the transaction returned for each (block, index) is the one at that index of the body.
+
+Batches run on a bounded worker pool. Issues and per batch results are streamed to '<output>.jsonl', progress is
+checkpointed to '<output>.checkpoint.json' so that an interrupted scan resumes where it stopped (--restart to
+start over). The checkpoint also holds the size of the results at that point, lines written after it are
+dropped on resume since their batches are checked again. Exits with 1 if any issue was found.
+
+Example:
+    python3 chain_crawler.py --endpoint https://api.s0.b.hmny.io/ --start 0 --end 1000000 --workers 8
+"""
+import argparse
+import itertools
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from topology import Topology
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Parallel, checkpointed block & transaction integrity crawler.')
+    parser.add_argument("--endpoint", dest="endpoint", default="https://api.s0.b.hmny.io/", type=str,
+                        help="Seed endpoint, the other shards are found from its sharding structure. "
+                             "Default is https://api.s0.b.hmny.io/")
+    parser.add_argument("--shards", dest="shards", default=None, type=str,
+                        help="Comma separated shards to crawl. Default is all shards.")
+    parser.add_argument("--start", dest="start", default=0, type=int,
+                        help="First block to check. Default is 0.")
+    parser.add_argument("--end", dest="end", default=None, type=int,
+                        help="Last block to check. Default is the latest block of each shard when the scan starts.")
+    parser.add_argument("--batch_size", dest="batch_size", default=50, type=int,
+                        help="Number of consecutive blocks per batch. Default is 50.")
+    parser.add_argument("--max_batch_calls", dest="max_batch_calls", default=500, type=int,
+                        help="Max number of calls in one batched JSON-RPC request. Default is 500.")
+    parser.add_argument("--workers", dest="workers", default=8, type=int,
+                        help="Number of batches checked concurrently. Default is 8.")
+    parser.add_argument("--retries", dest="retries", default=3, type=int,
+                        help="Retries of a failed batched request (with backoff). Default is 3.")
+    parser.add_argument("--timeout", dest="timeout", default=30, type=float,
+                        help="Timeout (in seconds) of every batched request. Default is 30.")
+    parser.add_argument("--checkpoint_interval", dest="checkpoint_interval", default=5, type=float,
+                        help="Seconds between two checkpoint writes. Default is 5.")
+    parser.add_argument("--restart", dest="restart", action='store_true', default=False,
+                        help="Ignore (and overwrite) the existing checkpoint and results.")
+    parser.add_argument("--output", dest="output", default="./chain_crawl", type=str,
+                        help="Path prefix of the results (.jsonl) and checkpoint (.checkpoint.json). "
+                             "Default is ./chain_crawl")
+    return parser.parse_args()
+
+
+class Checkpoint:
+    """
+    Per shard range, low watermark (every block below it is checked) and the checked ranges above it
+    (batches finished out of order, adjacent ones merged), so the state stays small whatever the range.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {"shards": {}, "totals": {"blocks": 0, "txs": 0, "issues": 0}, "results_offset": 0}
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                self.state = json.load(f)
+
+    def shard(self, shard, start, end) -> dict:
+        """
+        Progress of the shard, reset if the requested range differs from the checkpointed one.
+        """
+        progress = self.state["shards"].get(str(shard))
+        if progress is None or progress["start"] != start or (end is not None and progress["end"] != end):
+            if progress is not None:
+                print(f"[!] Range of shard {shard} changed, restarting it from block {start}")
+            progress = self.state["shards"][str(shard)] = {"start": start, "end": end, "done_below": start, "done": {}}
+        return progress
+
+    def pending(self, shard, batch_size):
+        """
+        Yields the (first, last) blocks of every batch of the shard that is not checked yet.
+        """
+        progress = self.state["shards"][str(shard)]
+        done = {int(first): last for first, last in progress["done"].items()}
+        next_done = sorted(done)
+        first = progress["done_below"]
+        while first <= progress["end"]:
+            if first in done:
+                first = done[first] + 1
+                continue
+            limit = min([f for f in next_done if f > first] + [progress["end"] + 1])
+            last = min(first + batch_size - 1, limit - 1)
+            yield first, last
+            first = last + 1
+
+    def mark_done(self, shard, first, last, blocks, txs, issues) -> None:
+        progress = self.state["shards"][str(shard)]
+        done = progress["done"]
+        if str(last + 1) in done:
+            last = done.pop(str(last + 1))
+        before = next((f for f, l in done.items() if l == first - 1), None)
+        if before is not None:
+            done[before] = last
+        else:
+            done[str(first)] = last
+        while str(progress["done_below"]) in done:
+            progress["done_below"] = done.pop(str(progress["done_below"])) + 1
+        totals = self.state["totals"]
+        totals["blocks"], totals["txs"], totals["issues"] = totals["blocks"] + blocks, totals["txs"] + txs, \
+            totals["issues"] + issues
+
+    def save(self, results_offset) -> None:
+        """
+        results_offset: size of the (flushed) results file, every batch checked so far is written below it.
+        """
+        self.state["results_offset"] = results_offset
+        with open(f"{self.path}.tmp", 'w') as f:
+            json.dump(self.state, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+def _hash(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _int(value):
+    return int(value, 16) if isinstance(value, str) else value
+
+
+def batch_call(shard, calls) -> list:
+    """
+    (result, error) of every call, split in requests of at most args.max_batch_calls calls, retried with backoff.
+    """
+    results = []
+    for i in range(0, len(calls), args.max_batch_calls):
+        chunk = calls[i:i + args.max_batch_calls]
+        for attempt in range(args.retries + 1):
+            try:
+                results.extend(TOPOLOGY.batch(shard, chunk, timeout=args.timeout))
+                break
+            except (requests.RequestException, RuntimeError):
+                if attempt == args.retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+    return results
+
+
+def check_batch(shard, first, last) -> dict:
+    issues = []
+
+    def issue(block, check, **details):
+        issues.append({"type": "issue", "shard": shard, "block": block, "check": check, **details})
+
+    numbers = list(range(first, last + 1))
+    calls = [("hmy_getBlockByNumber", [hex(first - 1), False])] if first > 0 else []
+    for n in numbers:
+        calls.append(("hmy_getBlockByNumber", [hex(n), True]))
+        calls.append(("hmy_getBlockTransactionCountByNumber", [hex(n)]))
+    results = batch_call(shard, calls)
+    previous = results.pop(0)[0] if first > 0 else None
+
+    blocks, second_calls, expected = {}, [], []
+    for n, (block, block_error), (count, count_error) in zip(numbers, results[0::2], results[1::2]):
+        if block_error or count_error:
+            issue(n, "rpc_error", error=block_error or count_error)
+            previous = None
+            continue
+        if block is None:
+            issue(n, "missing_block")
+            previous = None
+            continue
+        blocks[n] = block
+        txs = block.get("transactions") or []
+        if _int(block["number"]) != n:
+            issue(n, "block_number", got=block["number"])
+        if previous is not None and _hash(block["parentHash"]) != _hash(previous["hash"]):
+            issue(n, "parent_hash", parent_hash=block["parentHash"], previous_hash=previous["hash"])
+        if _int(count) != len(txs):
+            issue(n, "tx_count_by_number", count=count, body=len(txs))
+        second_calls.append(("hmy_getBlockTransactionCountByHash", [block["hash"]]))
+        expected.append((n, None))
+        for i in range(len(txs)):
+            second_calls.append(("hmy_getTransactionByBlockNumberAndIndex", [hex(n), hex(i)]))
+            expected.append((n, i))
+        previous = block
+
+    for (n, index), (result, error) in zip(expected, batch_call(shard, second_calls) if second_calls else []):
+        txs = blocks[n].get("transactions") or []
+        if error:
+            issue(n, "rpc_error", index=index, error=error)
+        elif index is None:
+            if _int(result) != len(txs):
+                issue(n, "tx_count_by_hash", count=result, body=len(txs))
+        elif result is None:
+            issue(n, "tx_by_index_missing", index=index)
+        else:
+            body_tx = txs[index]
+            if _hash(result.get("hash")) != _hash(body_tx.get("hash")):
+                issue(n, "tx_by_index_hash", index=index, got=result.get("hash"), body=body_tx.get("hash"))
+            if _int(result.get("blockNumber")) != n or _hash(result.get("blockHash")) != _hash(blocks[n]["hash"]):
+                issue(n, "tx_by_index_block", index=index, block_number=result.get("blockNumber"),
+                      block_hash=result.get("blockHash"))
+            if _int(result.get("transactionIndex")) != index:
+                issue(n, "tx_by_index_position", index=index, got=result.get("transactionIndex"))
+    return {
+        "type": "batch", "shard": shard, "first": first, "last": last, "blocks": len(blocks),
+        "txs": sum(len(b.get("transactions") or []) for b in blocks.values()), "issues": issues,
+    }
+
+
+def round_robin(generators):
+    """
+    Interleave the pending batches of all shards, so that shards are crawled in parallel.
+    """
+    for batch in itertools.chain.from_iterable(itertools.zip_longest(*generators)):
+        if batch is not None:
+            yield batch
+
+
+def crawl(shards, checkpoint, results_file) -> int:
+    """
+    Returns the number of issues found (including on previous runs of the checkpointed scan).
+    """
+    pending = round_robin([zip(itertools.repeat(s), checkpoint.pending(s, args.batch_size)) for s in shards])
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    in_flight, failed = {}, []
+    last_save = last_report = start = time.time()
+    blocks_checked = 0
+    try:
+        while True:
+            for shard, (first, last) in itertools.islice(pending, args.workers * 2 - len(in_flight)):
+                in_flight[executor.submit(check_batch, shard, first, last)] = (shard, first, last)
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                shard, first, last = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except (requests.RequestException, RuntimeError) as err:
+                    print(f"[!] Shard {shard} blocks {first}-{last} failed, left for the next run: {err}")
+                    failed.append((shard, first, last))
+                    continue
+                for found in result["issues"]:
+                    results_file.write(json.dumps(found) + "\n")
+                results_file.write(json.dumps({**result, "issues": len(result["issues"])}) + "\n")
+                checkpoint.mark_done(shard, first, last, result["blocks"], result["txs"], len(result["issues"]))
+                blocks_checked += result["blocks"]
+            now = time.time()
+            if now - last_save > args.checkpoint_interval:
+                results_file.flush()
+                checkpoint.save(results_file.tell())
+                last_save = now
+            if now - last_report > 10:
+                watermarks = {s: p["done_below"] for s, p in checkpoint.state["shards"].items()}
+                print(f"\t{blocks_checked / (now - start):.1f} blocks/s, checked below: {watermarks}, "
+                      f"totals: {checkpoint.state['totals']}")
+                last_report = now
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        results_file.flush()
+        checkpoint.save(results_file.tell())
+    if failed:
+        print(f"[!] {len(failed)} batch(es) failed, run again to retry them: {failed}")
+    return checkpoint.state["totals"]["issues"]
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    signal.signal(signal.SIGTERM, lambda signum, _: sys.exit(128 + signum))
+    TOPOLOGY = Topology([args.endpoint], timeout=args.timeout)
+    shards = [int(s) for s in args.shards.split(",")] if args.shards else sorted(TOPOLOGY.shards)
+    checkpoint_path = f"{args.output}.checkpoint.json"
+    if args.restart and os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    for shard in shards:
+        progress = checkpoint.shard(shard, args.start, args.end)
+        if progress["end"] is None:
+            progress["end"] = int(TOPOLOGY.call(shard, "hmy_blockNumber"), 16)
+        print(f"Shard {shard}: blocks {progress['start']}-{progress['end']}, "
+              f"resuming from block {progress['done_below']}")
+    issues = 0
+    try:
+        with open(f"{args.output}.jsonl", 'w' if args.restart else 'a') as results_file:
+            offset = checkpoint.state.get("results_offset")  # None for checkpoints written before it was tracked.
+            if offset is not None and results_file.tell() > offset:
+                print(f"Dropping {results_file.tell() - offset} byte(s) of results written after the last checkpoint")
+                results_file.truncate(offset)
+            issues = crawl(shards, checkpoint, results_file)
+    except KeyboardInterrupt:
+        print("\nInterrupted, run again to resume.")
+        issues = None
+    finally:
+        TOPOLOGY.close()
+    print(f"Totals: {checkpoint.state['totals']}, results in {args.output}.jsonl")
+    sys.exit(130 if issues is None else 1 if issues else 0)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Explorer vs RPC consistency and latency comparator.
+
+Every --interval seconds, over a sliding window of the latest --window blocks:
+  - finds the explorer's indexed head (its indexing lag in blocks and, from the RPC block timestamps, in seconds),
+  - fetches every newly indexed block from the explorer (blocks?from=h&to=h) and the RPC node (hmy_getBlockByNumber)
+    concurrently, then their transactions (tx?id= and hmy_getTransactionByHash), and diffs them field by field,
+  - records the latency of both sides for the same requests.
+
+Divergences are streamed to '<output>_diffs.jsonl' as they are found and per cycle stats are appended to
+'<output>.csv'. The final summary (also written to '<output>.json') compares the explorer's indexing rate with
+the chain's block rate, to size explorer capacity against chain throughput. Latencies are summarized over the
+last --summary_window samples, so memory stays flat however long it runs.
+
+Example:
+    python3 explorer_compare.py --rpc_endpoint https://api.s0.b.hmny.io/ --exp_endpoint http://e0.b.hmny.io:5000/
+"""
+import argparse
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import requests
+
+from bench import RollingStats
+from hmy_crypto import from_one_address
+from topology import rpc_call
+
+_LOCAL = threading.local()
+
+
+def _int(value):
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    value = str(value).strip()
+    if value.lower().startswith("0x"):
+        return int(value, 16)
+    try:
+        return int(value)
+    except ValueError:
+        return int(Decimal(value))  # Exponent notation, e.g. "1e+21"; float() would drop digits past 2^53.
+
+
+def _timestamp(value):
+    """
+    Seconds, explorers may return milliseconds.
+    """
+    value = _int(value)
+    return value // 1000 if value is not None and value > 10 ** 11 else value
+
+
+def _hash(value):
+    return None if value is None else value.lower().replace("0x", "", 1)
+
+
+def _address(value):
+    if not value:
+        return None  # Contract creations: explorers send "", RPC sends null.
+    try:
+        return from_one_address(value).hex()
+    except ValueError:
+        return value.lower()
+
+
+def _count(value):
+    return len(value) if isinstance(value, list) else _int(value)
+
+
+# (field, RPC key, explorer key, normalizer), nested explorer keys are dotted.
+BLOCK_FIELDS = [
+    ("hash", "hash", "id", _hash),
+    ("number", "number", "height", _int),
+    ("parent_hash", "parentHash", "prevBlock.id", _hash),
+    ("timestamp", "timestamp", "timestamp", _timestamp),
+    ("epoch", "epoch", "epoch", _int),
+    ("tx_count", "transactions", "txCount", _count),
+]
+TX_FIELDS = [
+    ("hash", "hash", "id", _hash),
+    ("from", "from", "from", _address),
+    ("to", "to", "to", _address),
+    ("value", "value", "value", _int),
+    ("gas", "gas", "gas", _int),
+    ("gas_price", "gasPrice", "gasPrice", _int),
+    ("timestamp", "timestamp", "timestamp", _timestamp),
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Explorer vs RPC consistency and latency comparator.')
+    parser.add_argument("--rpc_endpoint", dest="rpc_endpoint", default="https://api.s0.b.hmny.io/", type=str,
+                        help="RPC endpoint of the shard indexed by the explorer. Default is https://api.s0.b.hmny.io/")
+    parser.add_argument("--exp_endpoint", dest="exp_endpoint", default="http://e0.b.hmny.io:5000/", type=str,
+                        help="Explorer endpoint. Default is http://e0.b.hmny.io:5000/")
+    parser.add_argument("--window", dest="window", default=20, type=int,
+                        help="Number of latest blocks checked each cycle. Default is 20.")
+    parser.add_argument("--interval", dest="interval", default=5, type=float,
+                        help="Seconds between two cycles. Default is 5.")
+    parser.add_argument("--duration", dest="duration", default=300, type=float,
+                        help="Seconds to run for, 0 runs until interrupted. Default is 300.")
+    parser.add_argument("--max_txs", dest="max_txs", default=50, type=int,
+                        help="Max number of transactions compared per cycle. Default is 50.")
+    parser.add_argument("--workers", dest="workers", default=16, type=int,
+                        help="Number of concurrent requests. Default is 16.")
+    parser.add_argument("--max_lag_probe", dest="max_lag_probe", default=100000, type=int,
+                        help="How far back (in blocks) to look for the explorer's head when it is behind the window. "
+                             "Default is 100000.")
+    parser.add_argument("--timeout", dest="timeout", default=10, type=float,
+                        help="Timeout (in seconds) of every request. Default is 10.")
+    parser.add_argument("--summary_window", dest="summary_window", default=1000, type=int,
+                        help="Number of latest samples per latency series kept for the summary. Default is 1000.")
+    parser.add_argument("--output", dest="output", default="./explorer_compare", type=str,
+                        help="Path prefix of the results (.csv, .json and _diffs.jsonl). Default is ./explorer_compare")
+    return parser.parse_args()
+
+
+def _lookup(data, dotted_key):
+    for key in dotted_key.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def diff(kind, key, rpc_data, exp_data, fields) -> tuple:
+    """
+    Returns (divergences, missing fields). Fields the explorer does not return are missing, not divergent.
+    """
+    divergences, missing = [], []
+    for field, rpc_key, exp_key, normalize in fields:
+        exp_value = _lookup(exp_data, exp_key)
+        if exp_value is None:
+            missing.append(field)
+            continue
+        try:
+            rpc_norm, exp_norm = normalize(_lookup(rpc_data, rpc_key)), normalize(exp_value)
+        except (ValueError, TypeError, AttributeError):
+            rpc_norm, exp_norm = _lookup(rpc_data, rpc_key), exp_value
+        if rpc_norm != exp_norm:
+            divergences.append({"kind": kind, "key": key, "field": field,
+                                "rpc": _lookup(rpc_data, rpc_key), "explorer": exp_value})
+    return divergences, missing
+
+
+CYCLE_COLUMNS = ["time", "head", "explorer_head", "lag_blocks", "lag_s", "blocks_compared", "txs_compared",
+                 "divergences"]
+
+
+class Comparator:
+    def __init__(self, rpc_endpoint, exp_endpoint, window, max_txs, workers, timeout, max_lag_probe,
+                 summary_window=1000):
+        self.rpc_endpoint = rpc_endpoint
+        self.exp_endpoint = exp_endpoint.rstrip("/") + "/"
+        self.window = window
+        self.max_txs = max_txs
+        self.timeout = timeout
+        self.max_lag_probe = max_lag_probe
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.stats = RollingStats(summary_window)  # '<source> <kind>' and 'indexing delay' latencies.
+        self.compared = set()  # Heights already compared, pruned to the window.
+        self.exp_head = None
+        self.divergent_fields = {}
+        self.missing_fields = {}
+
+    def _record(self, source, kind, seconds) -> None:
+        self.stats.record(f"{source} {kind}", seconds)
+
+    def rpc(self, kind, method, params):
+        start = time.perf_counter()
+        try:
+            return rpc_call(self.rpc_endpoint, method, params, timeout=self.timeout)
+        finally:
+            self._record("rpc", kind, time.perf_counter() - start)
+
+    def explorer(self, kind, path):
+        if not hasattr(_LOCAL, "session"):
+            _LOCAL.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = _LOCAL.session.get(f"{self.exp_endpoint}{path}", timeout=self.timeout)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
+        finally:
+            self._record("explorer", kind, time.perf_counter() - start)
+
+    def explorer_blocks(self, start, end) -> list:
+        blocks = self.explorer("window", f"blocks?from={start}&to={end}")
+        return [b for b in blocks or [] if _int(b.get("height")) is not None]
+
+    def _explorer_has(self, height) -> bool:
+        return bool(self.explorer_blocks(height, height))
+
+    def find_explorer_head(self, head, window_blocks):
+        """
+        Highest height indexed by the explorer, probing back exponentially if it is behind the window.
+        """
+        if window_blocks:
+            return max(_int(b["height"]) for b in window_blocks)
+        missing, step = head - self.window + 1, self.window
+        while step <= self.max_lag_probe and head - step >= 0:
+            if self._explorer_has(head - step):
+                found = head - step
+                while missing - found > 1:
+                    middle = (found + missing) // 2
+                    found, missing = (middle, missing) if self._explorer_has(middle) else (found, middle)
+                return found
+            missing, step = head - step, step * 2
+        return None
+
+    def fetch_both(self, kind, requests_by_key) -> list:
+        """
+        Send the RPC & explorer request of every key concurrently, returns (key, RPC result, explorer result) tuples.
+        """
+        futures = [(key, self.executor.submit(self.rpc, kind, method, params),
+                    self.executor.submit(self.explorer, kind, path))
+                   for key, (method, params, path) in requests_by_key]
+        return [(key, rpc_future.result(), exp_future.result()) for key, rpc_future, exp_future in futures]
+
+    def cycle(self, diffs_file) -> dict:
+        now = time.time()
+        head = int(self.rpc("head", "hmy_blockNumber", []), 16)
+        start = max(0, head - self.window + 1)
+        window_blocks = self.explorer_blocks(start, head)
+        exp_head = self.find_explorer_head(head, window_blocks)
+        heights = sorted({_int(b["height"]) for b in window_blocks} - self.compared)
+        blocks = self.fetch_both("block", [(h, ("hmy_getBlockByNumber", [hex(h), False], f"blocks?from={h}&to={h}"))
+                                           for h in heights])
+
+        divergences, timestamps = [], {}
+        tx_hashes = []
+        for height, rpc_block, exp_blocks in blocks:
+            exp_block = (exp_blocks or [None])[0]
+            if rpc_block is None or exp_block is None:
+                continue
+            timestamps[height] = _int(rpc_block["timestamp"])
+            found, missing = diff("block", height, rpc_block, exp_block, BLOCK_FIELDS)
+            divergences.extend(found)
+            for field in missing:
+                self.missing_fields[field] = self.missing_fields.get(field, 0) + 1
+            tx_hashes.extend(t if isinstance(t, str) else t["hash"] for t in rpc_block.get("transactions", []))
+        txs = self.fetch_both("tx", [(h, ("hmy_getTransactionByHash", [h], f"tx?id={h}"))
+                                     for h in tx_hashes[:self.max_txs]])
+        txs_compared = 0
+        for tx_hash, rpc_tx, exp_tx in txs:
+            if exp_tx is None or rpc_tx is None:
+                divergences.append({"kind": "tx", "key": tx_hash, "field": "presence",
+                                    "rpc": rpc_tx is not None, "explorer": exp_tx is not None})
+                continue
+            txs_compared += 1
+            found, missing = diff("tx", tx_hash, rpc_tx, exp_tx, TX_FIELDS)
+            divergences.extend(found)
+            for field in missing:
+                self.missing_fields[field] = self.missing_fields.get(field, 0) + 1
+        for divergence in divergences:
+            self.divergent_fields[divergence["field"]] = self.divergent_fields.get(divergence["field"], 0) + 1
+            diffs_file.write(json.dumps({"time": now, **divergence}, default=str) + "\n")
+        diffs_file.flush()
+
+        # Indexing delay of blocks that appeared on the explorer since the previous cycle.
+        if self.exp_head is not None and exp_head is not None:
+            for height in range(self.exp_head + 1, exp_head + 1):
+                if height in timestamps:
+                    self.stats.record("indexing delay", now - timestamps[height])
+        self.exp_head = exp_head if exp_head is not None else self.exp_head
+        self.compared = {h for h in self.compared | set(heights) if h >= start}
+
+        lag_s = None
+        if exp_head is not None and exp_head >= start:
+            head_block = self.rpc("lag", "hmy_getBlockByNumber", [hex(head), False])
+            exp_head_block = self.rpc("lag", "hmy_getBlockByNumber", [hex(exp_head), False])
+            lag_s = _int(head_block["timestamp"]) - _int(exp_head_block["timestamp"])
+        return {
+            "time": round(now, 3), "head": head, "explorer_head": exp_head,
+            "lag_blocks": head - exp_head if exp_head is not None else None, "lag_s": lag_s,
+            "blocks_compared": len(timestamps), "txs_compared": txs_compared, "divergences": len(divergences),
+        }
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+class CycleTotals:
+    """
+    What the final summary needs from the per cycle rows, in constant memory.
+    """
+
+    def __init__(self):
+        self.cycles = 0
+        self.lag_count, self.lag_sum, self.lag_max, self.lag_last = 0, 0, None, None
+        self.first_head = self.last_head = None  # First & last rows where the explorer head was found.
+
+    def add(self, row) -> None:
+        self.cycles += 1
+        if row["lag_blocks"] is not None:
+            self.lag_count += 1
+            self.lag_sum += row["lag_blocks"]
+            self.lag_max = row["lag_blocks"] if self.lag_max is None else max(self.lag_max, row["lag_blocks"])
+            self.lag_last = row["lag_blocks"]
+        if row["explorer_head"] is not None:
+            self.first_head = self.first_head or row
+            self.last_head = row
+
+
+def print_summary(comparator, totals) -> dict:
+    """
+    Print the final summary, returns it as a dict.
+    """
+    summary = {"cycles": totals.cycles, "latencies": comparator.stats.summary(),
+               "divergent_fields": comparator.divergent_fields, "missing_fields": comparator.missing_fields}
+    print("\n== Summary ==")
+    for name, stats in summary["latencies"].items():
+        print(f"\t{name}: {stats}")
+    if totals.lag_count:
+        summary["lag_blocks"] = {"mean": round(totals.lag_sum / totals.lag_count, 1), "max": totals.lag_max,
+                                 "last": totals.lag_last}
+        print(f"\tExplorer lag (blocks): mean {summary['lag_blocks']['mean']}, max {totals.lag_max}, "
+              f"last {totals.lag_last}")
+    first, last = totals.first_head, totals.last_head
+    if first is not None and last["time"] > first["time"]:
+        elapsed = last["time"] - first["time"]
+        chain_rate = (last["head"] - first["head"]) / elapsed
+        exp_rate = (last["explorer_head"] - first["explorer_head"]) / elapsed
+        summary["chain_blocks_per_s"], summary["explorer_blocks_per_s"] = round(chain_rate, 3), round(exp_rate, 3)
+        print(f"\tChain: {chain_rate:.3f} blocks/s, explorer indexing: {exp_rate:.3f} blocks/s"
+              f"{' (falling behind)' if exp_rate < chain_rate else ''}")
+    print(f"\tDivergences per field: {comparator.divergent_fields or 'none'}")
+    if comparator.missing_fields:
+        print(f"\tFields not returned by the explorer: {comparator.missing_fields}")
+    return summary
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    comparator = Comparator(args.rpc_endpoint, args.exp_endpoint, args.window, args.max_txs, args.workers,
+                            args.timeout, args.max_lag_probe, args.summary_window)
+    deadline = time.time() + args.duration if args.duration else float("inf")
+    totals = CycleTotals()
+    try:
+        with open(f"{args.output}_diffs.jsonl", 'a') as diffs_file, \
+                open(f"{args.output}.csv", 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=CYCLE_COLUMNS)
+            writer.writeheader()
+            while time.time() < deadline:
+                started = time.time()
+                try:
+                    row = comparator.cycle(diffs_file)
+                except (requests.RequestException, RuntimeError, ValueError, KeyError, TypeError) as err:
+                    print(f"[!] Cycle failed: {err}")
+                else:
+                    totals.add(row)
+                    print(f"\t{row}")
+                    writer.writerow(row)
+                    csv_file.flush()
+                time.sleep(max(0.0, min(started + args.interval, deadline) - time.time()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        comparator.close()
+    with open(f"{args.output}.json", 'w') as f:
+        json.dump(print_summary(comparator, totals), f, indent=2)
+    print(f"Results written to {args.output}.csv, {args.output}.json and {args.output}_diffs.jsonl")
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Filter API stress test.
+
+Opens an increasing number of concurrent filters (hmy_newBlockFilter, hmy_newPendingTransactionFilter,
+hmy_newFilter) and polls each of them with hmy_getFilterChanges at a fixed rate while transactions flow,
+all from one asyncio event loop over a bounded pool of keep-alive connections. For every filter count
+and type it reports the poll latency, payload size and changes per poll, then checks the expiry behaviour
+on a few filters that were left idle for the whole step.
+
+Without --endpoint, a local chain simulator (localnet_sim.py) is started as a subprocess and a
+throwaway account it funds at genesis sends the transactions, so the test runs offline.
+
+Example:
+    python3 filter_stress.py --filters 100,1000,5000 --duration 30
+    python3 filter_stress.py --endpoint http://localhost:9500/ --tx_key 0x... --filters 1000,10000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import ssl
+import subprocess
+import sys
+import time
+import urllib.parse
+
+import requests
+
+from bench import summarize, write_results, rss_bytes
+from hmy_crypto import (SECP256K1_N, private_key_to_point, point_to_address, sign_transaction,
+                        to_one_address)
+from topology import rpc_call
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FILTER_METHODS = {
+    "block": "hmy_newBlockFilter",
+    "pending": "hmy_newPendingTransactionFilter",
+    "logs": "hmy_newFilter",
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Stress test of the filter API (hmy_newFilter & co).')
+    parser.add_argument("--endpoint", dest="endpoint", default=None, type=str,
+                        help="RPC endpoint to test. Default is None (starts a local chain simulator).")
+    parser.add_argument("--filters", dest="filters", default="100,1000,5000", type=str,
+                        help="Comma separated number of concurrent filters of each step. Default is '100,1000,5000'.")
+    parser.add_argument("--filter_types", dest="filter_types", default="block,pending,logs", type=str,
+                        help="Comma separated filter types, spread evenly over the filters of a step. "
+                             "Default is 'block,pending,logs'.")
+    parser.add_argument("--poll_interval", dest="poll_interval", default=1.0, type=float,
+                        help="Seconds between two polls of the same filter. Default is 1.")
+    parser.add_argument("--duration", dest="duration", default=30, type=float,
+                        help="Seconds each step polls its filters for. Default is 30.")
+    parser.add_argument("--connections", dest="connections", default=64, type=int,
+                        help="Max number of concurrent HTTP connections. Default is 64.")
+    parser.add_argument("--idle_filters", dest="idle_filters", default=10, type=int,
+                        help="Filters per step that are never polled, to check their expiry at the end of the step. "
+                             "Default is 10.")
+    parser.add_argument("--tx_rate", dest="tx_rate", default=5, type=float,
+                        help="Transactions per second sent during the steps (0 to disable). Default is 5.")
+    parser.add_argument("--tx_key", dest="tx_key", default=None, type=str,
+                        help="Hex private key of a funded account sending the transactions (to itself). "
+                             "Default is None (a throwaway key, only funded by the local simulator).")
+    parser.add_argument("--chain_id", dest="chain_id", default=2, type=int,
+                        help="Chain ID used to sign the transactions. Default is 2 (testnet & localnet).")
+    parser.add_argument("--sim_port", dest="sim_port", default=9620, type=int,
+                        help="Port of the local simulator. Default is 9620.")
+    parser.add_argument("--sim_block_time_ms", dest="sim_block_time_ms", default=1000, type=int,
+                        help="Block time of the local simulator. Default is 1000.")
+    parser.add_argument("--sim_filter_timeout", dest="sim_filter_timeout", default=10, type=float,
+                        help="Seconds before an unpolled filter expires on the local simulator. Default is 10.")
+    parser.add_argument("--output", dest="output", default="./filter_stress", type=str,
+                        help="Path prefix of the results (.csv and .json). Default is ./filter_stress")
+    return parser.parse_args()
+
+
+class AsyncRpc:
+    """
+    Minimal keep-alive HTTP/1.1 JSON-RPC client on asyncio streams, with at most `connections` open connections.
+    """
+
+    def __init__(self, endpoint, connections=64, timeout=10):
+        url = urllib.parse.urlsplit(endpoint)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.path = url.path or "/"
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.timeout = timeout
+        self.ids = itertools.count(1)
+        self.pool = asyncio.Queue()
+        for _ in range(connections):
+            self.pool.put_nowait(None)  # Connected on first use.
+
+    async def _roundtrip(self, conn, body):
+        reader, writer = conn
+        writer.write(f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by the server")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            data = b"".join(chunks)
+        else:
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+        return int(status_line.split()[1]), data, headers.get("connection", "").lower() != "close"
+
+    async def call(self, method, params=None):
+        """
+        Returns (result, error, seconds, response bytes). Seconds exclude the wait for a free connection.
+        """
+        body = json.dumps({"jsonrpc": "2.0", "method": method, "params": params or [], "id": next(self.ids)}).encode()
+        conn = await self.pool.get()
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+            status, data, keep_alive = await asyncio.wait_for(self._roundtrip(conn, body), self.timeout)
+            if not keep_alive:
+                conn[1].close()
+                conn = None
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as err:
+            if conn is not None:
+                conn[1].close()
+                conn = None
+            return None, f"{type(err).__name__}: {err}", time.perf_counter() - start, 0
+        finally:
+            self.pool.put_nowait(conn)
+        elapsed = time.perf_counter() - start
+        if status != 200:
+            return None, f"HTTP {status}", elapsed, len(data)
+        try:
+            response = json.loads(data)
+        except json.JSONDecodeError:
+            return None, f"Non JSON response: {data[:200]}", elapsed, len(data)
+        if "error" in response:
+            return None, str(response["error"].get("message", response["error"])), elapsed, len(data)
+        return response.get("result"), None, elapsed, len(data)
+
+    def close(self) -> None:
+        while not self.pool.empty():
+            conn = self.pool.get_nowait()
+            if conn is not None:
+                conn[1].close()
+
+
+class TransactionFlow:
+    """
+    Sends `rate` self-transfers per second from one account, resyncing its nonce after failures.
+    """
+
+    def __init__(self, rpc, private_key, chain_id, rate):
+        self.rpc = rpc
+        self.private_key = private_key
+        self.address = point_to_address(private_key_to_point(private_key))
+        self.chain_id = chain_id
+        self.rate = rate
+        self.nonce = None
+        self.sent = 0
+        self.errors = 0
+
+    async def _sync_nonce(self) -> None:
+        result, error, _, _ = await self.rpc.call("hmy_getTransactionCount", [to_one_address(self.address), "pending"])
+        if error is None:
+            self.nonce = int(result, 16)
+
+    async def run(self, deadline) -> None:
+        loop = asyncio.get_running_loop()
+        next_send = loop.time()
+        while loop.time() < deadline:
+            if self.nonce is None:
+                await self._sync_nonce()
+            if self.nonce is not None:
+                raw_txn = await asyncio.to_thread(sign_transaction, self.private_key, self.nonce, 1, 21000, 0, 0,
+                                                  self.address, 0, b'', self.chain_id)
+                _, error, _, _ = await self.rpc.call("hmy_sendRawTransaction", ["0x" + raw_txn.hex()])
+                if error is None:
+                    self.nonce, self.sent = self.nonce + 1, self.sent + 1
+                else:
+                    self.nonce, self.errors = None, self.errors + 1
+            next_send += 1 / self.rate
+            await asyncio.sleep(max(0.0, next_send - loop.time()))
+
+
+async def run_step(rpc, count, filter_types, flow, server_pid=None) -> list:
+    """
+    Open `count` filters, poll them for args.duration seconds and uninstall them. Returns one row per filter type.
+    """
+    loop = asyncio.get_running_loop()
+    stats = {t: {"create": [], "create_errors": 0, "polls": [], "payloads": [], "changes": 0, "errors": 0,
+                 "late": 0, "expired": 0, "idle": 0, "idle_expired": 0} for t in filter_types}
+
+    async def create(filter_type):
+        params = [{"fromBlock": "latest", "toBlock": "latest"}] if filter_type == "logs" else []
+        result, error, seconds, _ = await rpc.call(FILTER_METHODS[filter_type], params)
+        if error is not None:
+            stats[filter_type]["create_errors"] += 1
+            return None
+        stats[filter_type]["create"].append(seconds)
+        return filter_type, result
+
+    created = await asyncio.gather(*(create(filter_types[i % len(filter_types)]) for i in range(count)))
+    filters = [f for f in created if f is not None]
+    created_at = loop.time()
+    idle, polled = filters[:args.idle_filters], filters[args.idle_filters:]
+    for filter_type, _ in idle:
+        stats[filter_type]["idle"] += 1
+    deadline = created_at + args.duration
+
+    async def poll(filter_type, filter_id):
+        step = stats[filter_type]
+        next_poll = loop.time() + random.uniform(0, args.poll_interval)
+        while True:
+            await asyncio.sleep(max(0.0, next_poll - loop.time()))
+            if loop.time() >= deadline:
+                return
+            if loop.time() - next_poll > args.poll_interval:
+                step["late"] += 1
+            result, error, seconds, size = await rpc.call("hmy_getFilterChanges", [filter_id])
+            if error is not None:
+                step["errors"] += 1
+                if "not found" in error:
+                    step["expired"] += 1
+                    return
+            else:
+                step["polls"].append(seconds)
+                step["payloads"].append(size)
+                step["changes"] += len(result or [])
+            next_poll += args.poll_interval
+
+    tasks = [poll(t, f) for t, f in polled]
+    if flow:
+        tasks.append(flow.run(deadline))
+    server_rss = []
+
+    async def sample_server_rss():
+        while loop.time() < deadline:
+            server_rss.append(rss_bytes(server_pid))
+            await asyncio.sleep(1)
+
+    if server_pid:
+        tasks.append(sample_server_rss())
+    await asyncio.gather(*tasks)
+
+    idle_age = loop.time() - created_at
+    for (filter_type, filter_id), (_, error, _, _) in zip(idle, await asyncio.gather(
+            *(rpc.call("hmy_getFilterChanges", [f]) for _, f in idle))):
+        if error is not None and "not found" in error:
+            stats[filter_type]["idle_expired"] += 1
+    await asyncio.gather(*(rpc.call("hmy_uninstallFilter", [f]) for _, f in filters))
+
+    rows = []
+    for filter_type, step in stats.items():
+        payloads = step["payloads"]
+        rows.append({
+            "filters": count, "type": filter_type, "created": len(step["create"]),
+            "create_errors": step["create_errors"],
+            **{f"create_{k}": v for k, v in summarize(step["create"]).items() if k != "samples"},
+            "polls": len(step["polls"]),
+            **{k: v for k, v in summarize(step["polls"]).items() if k != "samples"},
+            "payload_mean_bytes": round(sum(payloads) / len(payloads)) if payloads else 0,
+            "payload_max_bytes": max(payloads, default=0),
+            "changes_per_poll": round(step["changes"] / len(payloads), 3) if payloads else 0,
+            "poll_errors": step["errors"], "late_polls": step["late"], "expired_while_polled": step["expired"],
+            "idle_filters": step["idle"], "idle_age_s": round(idle_age, 1), "idle_expired": step["idle_expired"],
+            "txs_sent": flow.sent if flow else 0, "tx_errors": flow.errors if flow else 0,
+            "server_rss_max_mb": round(max(server_rss) / 2 ** 20, 1) if server_rss else None,
+        })
+    if flow:
+        flow.sent = flow.errors = 0
+    return rows
+
+
+def start_simulator(fund_address) -> subprocess.Popen:
+    endpoint = f"http://localhost:{args.sim_port}/"
+    proc = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "localnet_sim.py"), "--num_shards", "1",
+                             "--base_port", str(args.sim_port), "--block_time_ms", str(args.sim_block_time_ms),
+                             "--filter_timeout", str(args.sim_filter_timeout), "--keystore", "",
+                             "--fund", fund_address], stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while True:
+        try:
+            rpc_call(endpoint, "hmy_blockNumber", timeout=1)
+            return proc
+        except (requests.RequestException, RuntimeError):
+            if proc.poll() is not None or time.time() > deadline:
+                proc.kill()
+                raise RuntimeError(f"Could not start the local simulator on {endpoint}")
+            time.sleep(0.2)
+
+
+async def main(endpoint, private_key, server_pid) -> list:
+    rpc = AsyncRpc(endpoint, connections=args.connections)
+    flow = TransactionFlow(rpc, private_key, args.chain_id, args.tx_rate) if private_key and args.tx_rate else None
+    filter_types = [t.strip() for t in args.filter_types.split(",")]
+    rows = []
+    try:
+        for count in [int(n) for n in args.filters.split(",")]:
+            print(f"== {count} filters ({', '.join(filter_types)}) for {args.duration}s ==")
+            step_rows = await run_step(rpc, count, filter_types, flow, server_pid)
+            for row in step_rows:
+                print(f"\t{row}")
+            rows.extend(step_rows)
+            write_results(rows, args.output)
+    finally:
+        rpc.close()
+    return rows
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    unknown = set(t.strip() for t in args.filter_types.split(",")) - set(FILTER_METHODS)
+    assert not unknown, f"Unknown filter type(s) {unknown}, must be in {sorted(FILTER_METHODS)}"
+    sim = None
+    if args.tx_key:
+        tx_key = int(args.tx_key, 16)
+    else:
+        tx_key = int.from_bytes(os.urandom(32), 'big') % (SECP256K1_N - 1) + 1 if not args.endpoint else None
+    if args.endpoint is None:
+        sim = start_simulator(to_one_address(point_to_address(private_key_to_point(tx_key))))
+        args.endpoint = f"http://localhost:{args.sim_port}/"
+        print(f"Started local simulator on {args.endpoint} (filter timeout {args.sim_filter_timeout}s)")
+    elif not tx_key:
+        print("[!] No --tx_key given, filters are polled without transaction flow.")
+    try:
+        asyncio.run(main(args.endpoint, tx_key, sim.pid if sim else None))
+        print(f"Results written to {args.output}.csv and {args.output}.json")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sim:
+            sim.terminate()
+            sim.wait()
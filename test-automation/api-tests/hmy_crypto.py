@@ -0,0 +1,429 @@
+"""
+Pure python primitives needed to read and produce Harmony transactions/addresses without
+external dependencies: keccak256, RLP, secp256k1 (public key derivation, signing & recovery) and bech32.
+
+These are intentionally simple (and slow compared to C implementations), they are meant for
+test tooling, NOT for handling real funds.
+"""
+import hashlib
+import hmac
+
+# ==== Keccak256 (original Keccak padding, NOT hashlib's sha3_256) ====
+
+_KECCAK_ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+_KECCAK_ROTATIONS = [
+    [0, 36, 3, 41, 18],
+    [1, 44, 10, 45, 2],
+    [62, 6, 43, 15, 61],
+    [28, 55, 25, 21, 56],
+    [27, 20, 39, 8, 14],
+]
+_MASK_64 = (1 << 64) - 1
+# Flattened (index = x + 5 * y) rho & pi steps: lane src is rotated by rot and moved to dst.
+_KECCAK_RHO_PI = [(x + 5 * y, y + 5 * ((2 * x + 3 * y) % 5), _KECCAK_ROTATIONS[x][y])
+                  for x in range(5) for y in range(5)]
+
+
+def _keccak_f(state):
+    """
+    Keccak-f[1600] permutation on a flat list of 25 lanes (index = x + 5 * y), in place.
+    """
+    b = [0] * 25
+    for round_constant in _KECCAK_ROUND_CONSTANTS:
+        c = [state[x] ^ state[x + 5] ^ state[x + 10] ^ state[x + 15] ^ state[x + 20] for x in range(5)]
+        for x in range(5):
+            d = c[(x - 1) % 5] ^ (((c[(x + 1) % 5] << 1) | (c[(x + 1) % 5] >> 63)) & _MASK_64)
+            for y in range(0, 25, 5):
+                state[x + y] ^= d
+        for src, dst, rot in _KECCAK_RHO_PI:
+            lane = state[src]
+            b[dst] = ((lane << rot) | (lane >> (64 - rot))) & _MASK_64 if rot else lane
+        for y in range(0, 25, 5):
+            b0, b1, b2, b3, b4 = b[y:y + 5]
+            state[y] = b0 ^ (~b1 & b2)
+            state[y + 1] = b1 ^ (~b2 & b3)
+            state[y + 2] = b2 ^ (~b3 & b4)
+            state[y + 3] = b3 ^ (~b4 & b0)
+            state[y + 4] = b4 ^ (~b0 & b1)
+        state[0] ^= round_constant
+
+
+def keccak256(data: bytes) -> bytes:
+    rate = 136
+    padded = bytearray(data) + b'\x01' + b'\x00' * ((rate - (len(data) + 1) % rate) % rate)
+    padded[-1] |= 0x80
+    state = [0] * 25
+    for offset in range(0, len(padded), rate):
+        for i in range(rate // 8):
+            state[i] ^= int.from_bytes(padded[offset + 8 * i:offset + 8 * i + 8], 'little')
+        _keccak_f(state)
+    return b''.join(state[i].to_bytes(8, 'little') for i in range(4))
+
+
+# ==== RLP ====
+
+def int_to_big_endian(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 7) // 8, 'big') if value else b''
+
+
+def big_endian_to_int(value: bytes) -> int:
+    return int.from_bytes(value, 'big') if value else 0
+
+
+def _rlp_length_prefix(length, offset):
+    if length < 56:
+        return bytes([offset + length])
+    length_bytes = int_to_big_endian(length)
+    return bytes([offset + 55 + len(length_bytes)]) + length_bytes
+
+
+def rlp_encode(item) -> bytes:
+    """
+    Items can be bytes, str (utf-8 encoded), non-negative ints or (nested) lists of those.
+    """
+    if isinstance(item, (list, tuple)):
+        payload = b''.join(rlp_encode(el) for el in item)
+        return _rlp_length_prefix(len(payload), 0xc0) + payload
+    if isinstance(item, int):
+        item = int_to_big_endian(item)
+    elif isinstance(item, str):
+        item = item.encode()
+    if len(item) == 1 and item[0] < 0x80:
+        return bytes(item)
+    return _rlp_length_prefix(len(item), 0x80) + bytes(item)
+
+
+def _rlp_decode_at(data, pos):
+    prefix = data[pos]
+    if prefix < 0x80:
+        return data[pos:pos + 1], pos + 1
+    if prefix < 0xb8:
+        end = pos + 1 + prefix - 0x80
+        return data[pos + 1:end], end
+    if prefix < 0xc0:
+        len_of_len = prefix - 0xb7
+        length = big_endian_to_int(data[pos + 1:pos + 1 + len_of_len])
+        start = pos + 1 + len_of_len
+        return data[start:start + length], start + length
+    if prefix < 0xf8:
+        start, end = pos + 1, pos + 1 + prefix - 0xc0
+    else:
+        len_of_len = prefix - 0xf7
+        start = pos + 1 + len_of_len
+        end = start + big_endian_to_int(data[pos + 1:start])
+    items = []
+    while start < end:
+        item, start = _rlp_decode_at(data, start)
+        items.append(item)
+    return items, end
+
+
+def rlp_decode(data: bytes):
+    """
+    Returns (nested) lists of bytes. Raises ValueError on malformed input.
+    """
+    try:
+        item, end = _rlp_decode_at(bytes(data), 0)
+    except IndexError as err:
+        raise ValueError("Truncated RLP data") from err
+    if end != len(data):
+        raise ValueError(f"Trailing bytes after RLP item ({len(data) - end} bytes)")
+    return item
+
+
+# ==== secp256k1 ====
+
+SECP256K1_P = 2 ** 256 - 2 ** 32 - 977
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+SECP256K1_G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+               0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+
+def _to_jacobian(point):
+    return point[0], point[1], 1
+
+
+def _from_jacobian(point):
+    x, y, z = point
+    if z == 0:
+        return None
+    z_inv = pow(z, -1, SECP256K1_P)
+    return (x * z_inv ** 2) % SECP256K1_P, (y * z_inv ** 3) % SECP256K1_P
+
+
+def _jacobian_double(point):
+    x, y, z = point
+    if not y:
+        return 0, 0, 0
+    ysq = (y ** 2) % SECP256K1_P
+    s = (4 * x * ysq) % SECP256K1_P
+    m = (3 * x ** 2) % SECP256K1_P
+    nx = (m ** 2 - 2 * s) % SECP256K1_P
+    ny = (m * (s - nx) - 8 * ysq ** 2) % SECP256K1_P
+    nz = (2 * y * z) % SECP256K1_P
+    return nx, ny, nz
+
+
+def _jacobian_add(p, q):
+    if not p[2]:
+        return q
+    if not q[2]:
+        return p
+    u1 = (p[0] * q[2] ** 2) % SECP256K1_P
+    u2 = (q[0] * p[2] ** 2) % SECP256K1_P
+    s1 = (p[1] * q[2] ** 3) % SECP256K1_P
+    s2 = (q[1] * p[2] ** 3) % SECP256K1_P
+    if u1 == u2:
+        return _jacobian_double(p) if s1 == s2 else (0, 0, 0)
+    h = u2 - u1
+    r = s2 - s1
+    h2 = (h * h) % SECP256K1_P
+    h3 = (h * h2) % SECP256K1_P
+    u1h2 = (u1 * h2) % SECP256K1_P
+    nx = (r ** 2 - h3 - 2 * u1h2) % SECP256K1_P
+    ny = (r * (u1h2 - nx) - s1 * h3) % SECP256K1_P
+    nz = (h * p[2] * q[2]) % SECP256K1_P
+    return nx, ny, nz
+
+
+def _jacobian_multiply(point, scalar):
+    result = (0, 0, 0)
+    addend = point
+    while scalar:
+        if scalar & 1:
+            result = _jacobian_add(result, addend)
+        addend = _jacobian_double(addend)
+        scalar >>= 1
+    return result
+
+
+def _jacobian_add_affine(p, q):
+    """
+    Jacobian p + affine q (mixed addition, cheaper than a full jacobian add).
+    """
+    if not p[2]:
+        return q[0], q[1], 1
+    z2 = (p[2] * p[2]) % SECP256K1_P
+    u2 = (q[0] * z2) % SECP256K1_P
+    s2 = (q[1] * z2 * p[2]) % SECP256K1_P
+    if p[0] == u2:
+        return _jacobian_double(p) if p[1] == s2 else (0, 0, 0)
+    h = u2 - p[0]
+    r = s2 - p[1]
+    h2 = (h * h) % SECP256K1_P
+    h3 = (h * h2) % SECP256K1_P
+    u1h2 = (p[0] * h2) % SECP256K1_P
+    nx = (r * r - h3 - 2 * u1h2) % SECP256K1_P
+    ny = (r * (u1h2 - nx) - p[1] * h3) % SECP256K1_P
+    nz = (h * p[2]) % SECP256K1_P
+    return nx, ny, nz
+
+
+_G_WINDOW_BITS = 4
+_G_TABLE = []
+
+
+def _g_table():
+    """
+    Lazily built table[w][d - 1] = d * 16^w * G (affine), makes G multiplication 64 mixed additions.
+    """
+    if not _G_TABLE:
+        base = _to_jacobian(SECP256K1_G)
+        for _ in range(256 // _G_WINDOW_BITS):
+            row, acc = [], base
+            for _ in range((1 << _G_WINDOW_BITS) - 1):
+                row.append(_from_jacobian(acc))
+                acc = _jacobian_add(acc, base)
+            _G_TABLE.append(row)
+            base = acc
+    return _G_TABLE
+
+
+def _g_multiply(scalar):
+    result = (0, 0, 0)
+    mask = (1 << _G_WINDOW_BITS) - 1
+    for row in _g_table():
+        digit = scalar & mask
+        if digit:
+            result = _jacobian_add_affine(result, row[digit - 1])
+        scalar >>= _G_WINDOW_BITS
+    return result
+
+
+def point_multiply(point, scalar):
+    return _from_jacobian(_jacobian_multiply(_to_jacobian(point), scalar % SECP256K1_N))
+
+
+def point_add(p, q):
+    return _from_jacobian(_jacobian_add(_to_jacobian(p), _to_jacobian(q)))
+
+
+def private_key_to_point(private_key: int):
+    if not 0 < private_key < SECP256K1_N:
+        raise ValueError("Private key out of range")
+    return _from_jacobian(_g_multiply(private_key))
+
+
+def compress_point(point) -> bytes:
+    return bytes([2 + (point[1] & 1)]) + point[0].to_bytes(32, 'big')
+
+
+def point_to_address(point) -> bytes:
+    """
+    Returns the 20 byte (Ethereum style) address of the public key.
+    """
+    return keccak256(point[0].to_bytes(32, 'big') + point[1].to_bytes(32, 'big'))[-20:]
+
+
+def recover_point(message_hash: bytes, recovery_id: int, r: int, s: int):
+    """
+    Recover the public key point that produced signature (r, s) over message_hash.
+    """
+    if not (0 < r < SECP256K1_N and 0 < s < SECP256K1_N) or recovery_id not in (0, 1):
+        raise ValueError("Invalid signature values")
+    x = r
+    alpha = (x ** 3 + 7) % SECP256K1_P
+    beta = pow(alpha, (SECP256K1_P + 1) // 4, SECP256K1_P)
+    y = beta if (beta - recovery_id) % 2 == 0 else SECP256K1_P - beta
+    if (y * y - alpha) % SECP256K1_P:
+        raise ValueError("Signature r value is not on the curve")
+    e = big_endian_to_int(message_hash)
+    r_inv = pow(r, -1, SECP256K1_N)
+    sr = _jacobian_multiply((x, y, 1), s)
+    eg = _g_multiply((-e) % SECP256K1_N)
+    return _from_jacobian(_jacobian_multiply(_jacobian_add(sr, eg), r_inv))
+
+
+def _rfc6979_nonce(message_hash: bytes, private_key: int):
+    """
+    Deterministic signature nonces (RFC 6979, HMAC-SHA256), yields candidates until one is used.
+    """
+    x, h = private_key.to_bytes(32, 'big'), (big_endian_to_int(message_hash) % SECP256K1_N).to_bytes(32, 'big')
+    v, k = b'\x01' * 32, b'\x00' * 32
+    k = hmac.new(k, v + b'\x00' + x + h, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    k = hmac.new(k, v + b'\x01' + x + h, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    while True:
+        v = hmac.new(k, v, hashlib.sha256).digest()
+        candidate = big_endian_to_int(v)
+        if 0 < candidate < SECP256K1_N:
+            yield candidate
+        k = hmac.new(k, v + b'\x00', hashlib.sha256).digest()
+        v = hmac.new(k, v, hashlib.sha256).digest()
+
+
+def sign(message_hash: bytes, private_key: int):
+    """
+    Returns (recovery_id, r, s) of a low-s signature of message_hash, as accepted by recover_point.
+    """
+    e = big_endian_to_int(message_hash)
+    for nonce in _rfc6979_nonce(message_hash, private_key):
+        x, y = _from_jacobian(_g_multiply(nonce))
+        r = x % SECP256K1_N
+        s = pow(nonce, -1, SECP256K1_N) * (e + r * private_key) % SECP256K1_N
+        if r == 0 or s == 0:
+            continue
+        recovery_id = y & 1
+        if s > SECP256K1_N // 2:
+            s, recovery_id = SECP256K1_N - s, recovery_id ^ 1
+        return recovery_id, r, s
+
+
+def sign_transaction(private_key: int, nonce, gas_price, gas, shard, to_shard, to: bytes, value,
+                     data=b'', chain_id=2) -> bytes:
+    """
+    Returns the raw (RLP) signed plain Harmony transaction, replay protected (EIP155) with chain_id.
+    """
+    fields = [nonce, gas_price, gas, shard, to_shard, to, value, data]
+    recovery_id, r, s = sign(keccak256(rlp_encode(fields + [chain_id, 0, 0])), private_key)
+    return rlp_encode(fields + [chain_id * 2 + 35 + recovery_id, r, s])
+
+
+# ==== bech32 ====
+
+_BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+_BECH32_GENERATORS = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+
+
+def _bech32_polymod(values):
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            chk ^= _BECH32_GENERATORS[i] if ((top >> i) & 1) else 0
+    return chk
+
+
+def _bech32_hrp_expand(hrp):
+    return [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp]
+
+
+def _convert_bits(data, from_bits, to_bits, pad=True):
+    acc, bits, ret = 0, 0, []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        acc = (acc << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            ret.append((acc >> bits) & max_value)
+    if pad and bits:
+        ret.append((acc << (to_bits - bits)) & max_value)
+    elif not pad and (bits >= from_bits or ((acc << (to_bits - bits)) & max_value)):
+        raise ValueError("Invalid padding in bech32 data")
+    return ret
+
+
+def bech32_encode(hrp: str, data: bytes) -> str:
+    five_bit = _convert_bits(data, 8, 5)
+    polymod = _bech32_polymod(_bech32_hrp_expand(hrp) + five_bit + [0] * 6) ^ 1
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + '1' + ''.join(_BECH32_CHARSET[d] for d in five_bit + checksum)
+
+
+def bech32_decode(bech: str):
+    """
+    Returns (hrp, data_bytes). Raises ValueError on bad checksum or format.
+    """
+    if bech.lower() != bech and bech.upper() != bech:
+        raise ValueError("Mixed case bech32 string")
+    bech = bech.lower()
+    pos = bech.rfind('1')
+    if pos < 1 or pos + 7 > len(bech):
+        raise ValueError(f"Invalid bech32 string: {bech}")
+    hrp = bech[:pos]
+    try:
+        data = [_BECH32_CHARSET.index(c) for c in bech[pos + 1:]]
+    except ValueError as err:
+        raise ValueError(f"Invalid bech32 character in {bech}") from err
+    if _bech32_polymod(_bech32_hrp_expand(hrp) + data) != 1:
+        raise ValueError(f"Invalid bech32 checksum: {bech}")
+    return hrp, bytes(_convert_bits(data[:-6], 5, 8, pad=False))
+
+
+def to_one_address(address: bytes) -> str:
+    return bech32_encode("one", address)
+
+
+def from_one_address(address: str) -> bytes:
+    """
+    Accepts both 'one1...' and '0x...' addresses, returns the 20 raw address bytes.
+    """
+    if address.startswith("0x") or address.startswith("0X"):
+        raw = bytes.fromhex(address[2:])
+    else:
+        hrp, raw = bech32_decode(address)
+        if hrp != "one":
+            raise ValueError(f"Unknown address prefix '{hrp}' for {address}")
+    if len(raw) != 20:
+        raise ValueError(f"Address {address} is not 20 bytes")
+    return raw
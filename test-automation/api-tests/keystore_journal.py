@@ -0,0 +1,146 @@
+"""
+Crash-safe journal of accounts added to the CLI's keystore by the test drivers.
+
+Every account name is journaled (and fsync'd) BEFORE its key is written to the keystore,
+so a run that dies at any point leaves a record of what it added. Journaled accounts are
+removed in parallel at exit (normal exit, exception, SIGTERM/SIGHUP), and entries left
+behind by previous runs that are no longer alive are reclaimed at the next startup.
+
+Each journal line is '<pid>\t<account name>', entries of live processes are never touched
+so several runs can share a keystore.
+"""
+import atexit
+import fcntl
+import os
+import shutil
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def default_journal_path(keystore_path) -> str:
+    """
+    Next to (not inside) the keystore, so the CLI does not see it as an account.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(keystore_path)), "test_keys.journal")
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class KeystoreJournal:
+    def __init__(self, keystore_path, journal_path=None, max_workers=16):
+        self.keystore_path = os.path.abspath(keystore_path)
+        self.journal_path = journal_path or default_journal_path(keystore_path)
+        self.max_workers = max_workers
+        self.pid = os.getpid()
+        self.names = []
+
+    def _read_entries(self) -> list:
+        try:
+            with open(self.journal_path, 'r') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            pid, _, name = line.partition("\t")
+            if name and pid.isdigit():
+                entries.append((int(pid), name))
+        return entries
+
+    def _rewrite(self, keep) -> None:
+        """
+        Replace the journal with the entries for which keep(pid, name) is true.
+        Must be called with the journal lock held.
+        """
+        entries = [e for e in self._read_entries() if keep(*e)]
+        tmp_path = f"{self.journal_path}.{self.pid}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.writelines(f"{pid}\t{name}\n" for pid, name in entries)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _locked(self):
+        lock_file = open(f"{self.journal_path}.lock", 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def record(self, name) -> None:
+        """
+        Journal an account name, call BEFORE writing the key to the keystore.
+        """
+        with self._locked():
+            with open(self.journal_path, 'a') as f:
+                f.write(f"{self.pid}\t{name}\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self.names.append(name)
+
+    def _remove_dir(self, name):
+        try:
+            shutil.rmtree(os.path.join(self.keystore_path, name))
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            return name, err
+        return name, None
+
+    def remove(self, names) -> list:
+        """
+        Remove the accounts from the keystore in parallel, returns the [(name, error)] that failed.
+        """
+        names = [n for n in names if n and os.sep not in n and n not in (".", "..")]
+        if not names:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._remove_dir, names))
+        return [(name, err) for name, err in results if err is not None]
+
+    def cleanup(self) -> list:
+        """
+        Remove every account journaled by this process, failed removals stay in the journal.
+        """
+        failures = self.remove(self.names)
+        failed = {name for name, _ in failures}
+        removed = set(self.names) - failed
+        with self._locked():
+            self._rewrite(lambda pid, name: pid != self.pid or name not in removed)
+        self.names = [n for n in self.names if n in failed]
+        for name, err in failures:
+            print(f"[!] Could not remove {name} from keystore: {err}")
+        return failures
+
+    def recover(self) -> list:
+        """
+        Remove accounts journaled by previous runs that are no longer alive, returns the names removed.
+        """
+        with self._locked():
+            orphans = [(pid, name) for pid, name in self._read_entries()
+                       if pid != self.pid and not _pid_alive(pid)]
+            if not orphans:
+                return []
+            failed = {name for name, _ in self.remove([name for _, name in orphans])}
+            reclaimed = {(pid, name) for pid, name in orphans if name not in failed}
+            self._rewrite(lambda pid, name: (pid, name) not in reclaimed)
+        return sorted(name for _, name in reclaimed)
+
+    def install(self) -> None:
+        """
+        Run cleanup at interpreter exit, including on SIGTERM and SIGHUP.
+        """
+        atexit.register(self.cleanup)
+
+        def _exit(signum, _frame):
+            sys.exit(128 + signum)
+
+        for sig in (signal.SIGTERM, signal.SIGHUP):
+            signal.signal(sig, _exit)
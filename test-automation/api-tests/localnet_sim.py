@@ -0,0 +1,895 @@
+#!/usr/bin/env python3
+"""
+In-process Harmony chain simulator.
+
+Serves the JSON-RPC surface used by test.py, testHmy.py and the newman collections on one port
+per shard (9500 + shard by default, same as a localnet), holding all chain state in memory.
+Blocks are produced on a fixed timer (configurable down to milliseconds), cross-shard
+transactions are delivered to the destination shard on its next block and staking
+transactions are applied on the beacon shard (shard 0).
+
+Signed transactions produced by the CLI are decoded and their sender is recovered from the
+signature, so balances and nonces behave like on a real network, and transactions signed for
+another chain ID are rejected. There is no EVM: contract calls, code and storage always return
+empty values. Only the latest --max_blocks blocks of each shard (and their transactions) are
+kept, so memory stays bounded with very short block times.
+
+Example (2 shards, 100ms blocks, funding the localnet keys):
+    python3 localnet_sim.py --num_shards=2 --block_time_ms=100 --keystore=./LocalnetValidatorKeys/
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from hmy_crypto import (keccak256, rlp_encode, rlp_decode, big_endian_to_int, recover_point,
+                        point_to_address, to_one_address, from_one_address)
+
+ONE = 10 ** 18
+BASE_TX_GAS = 21000
+STAKING_TX_GAS = 50000  # Flat part of a staking txn.
+STAKING_KEY_GAS = 5000  # Extra gas per BLS key included in a staking txn.
+UNDELEGATION_LOCK_EPOCHS = 7
+BEACON_SHARD = 0
+
+STAKING_DIRECTIVES = {
+    0: "CreateValidator",
+    1: "EditValidator",
+    2: "Delegate",
+    3: "Undelegate",
+    4: "CollectRewards",
+}
+
+
+class RpcError(Exception):
+    def __init__(self, message, code=-32000):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='In-process Harmony chain simulator.')
+    parser.add_argument("--num_shards", dest="num_shards", default=2,
+                        help="Number of shards to simulate. Default is 2.", type=int)
+    parser.add_argument("--host", dest="host", default="localhost",
+                        help="Host to serve the RPC endpoints on. Default is 'localhost'.", type=str)
+    parser.add_argument("--base_port", dest="base_port", default=9500,
+                        help="Port of shard 0, shard i is served on base_port + i. Default is 9500.", type=int)
+    parser.add_argument("--block_time_ms", dest="block_time_ms", default=1000,
+                        help="Block time (in milliseconds) of every shard. Default is 1000.", type=int)
+    parser.add_argument("--blocks_per_epoch", dest="blocks_per_epoch", default=5,
+                        help="Number of blocks in an epoch. Default is 5.", type=int)
+    parser.add_argument("--keystore", dest="keys_dir", default="./LocalnetValidatorKeys/",
+                        help="Directory of CLI formatted keys whose addresses are funded at genesis. "
+                             "Default is ./LocalnetValidatorKeys/", type=str)
+    parser.add_argument("--fund", dest="fund", default=[], action='append',
+                        help="Extra address (one1... or 0x...) to fund at genesis. Can be repeated.", type=str)
+    parser.add_argument("--genesis_balance", dest="genesis_balance", default=1e6,
+                        help="Balance (in ONE) of funded addresses on every shard. Default is 1000000.", type=float)
+    parser.add_argument("--block_reward", dest="block_reward", default=1,
+                        help="Staking reward (in ONE) split between delegations every beacon block. "
+                             "Default is 1.", type=float)
+    parser.add_argument("--filter_timeout", dest="filter_timeout", default=300,
+                        help="Seconds before an unpolled filter expires. Default is 300.", type=float)
+    parser.add_argument("--max_block_txs", dest="max_block_txs", default=1000,
+                        help="Max number of (plain + staking) transactions in a block. Default is 1000.", type=int)
+    parser.add_argument("--max_blocks", dest="max_blocks", default=10000,
+                        help="Number of latest blocks (and their transactions) kept per shard. Default is 10000.",
+                        type=int)
+    parser.add_argument("--chain_id", dest="chain_id", default=2,
+                        help="EIP-155 chain ID transactions must be signed with, the CLI uses 2 for localnet "
+                             "(and testnet). Default is 2.", type=int)
+    return parser.parse_args()
+
+
+def _hex(value: int) -> str:
+    return hex(value)
+
+
+def _bytes_hex(value: bytes) -> str:
+    return "0x" + value.hex()
+
+
+def _parse_hash(value) -> bytes:
+    try:
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    except (ValueError, AttributeError) as err:
+        raise RpcError(f"Invalid hash: {value}", code=-32602) from err
+
+
+def _parse_address(value) -> bytes:
+    try:
+        return from_one_address(value)
+    except (ValueError, AttributeError) as err:
+        raise RpcError(f"Invalid address: {value}", code=-32602) from err
+
+
+def _signer(message_hash, v, r, s) -> bytes:
+    """
+    Returns the sender address and chain ID (None if not replay protected) of a signature.
+    """
+    if v in (27, 28):
+        recovery_id, chain_id = v - 27, None
+    else:
+        recovery_id, chain_id = (v - 35) % 2, (v - 35) // 2
+    return point_to_address(recover_point(message_hash, recovery_id, r, s)), chain_id
+
+
+def decode_transaction(raw: bytes) -> dict:
+    """
+    Decode a signed plain transaction:
+        [nonce, gasPrice, gas, shardID, toShardID, to, value, data, v, r, s]
+    """
+    fields = rlp_decode(raw)
+    if not isinstance(fields, list) or len(fields) != 11:
+        raise ValueError("Not a Harmony transaction")
+    nonce, gas_price, gas, shard, to_shard = (big_endian_to_int(f) for f in fields[:5])
+    to, value, data = fields[5], big_endian_to_int(fields[6]), fields[7]
+    v, r, s = (big_endian_to_int(f) for f in fields[8:])
+    chain_fields = [] if v in (27, 28) else [(v - 35) // 2, 0, 0]
+    sender, chain_id = _signer(keccak256(rlp_encode(fields[:8] + chain_fields)), v, r, s)
+    return {
+        "hash": keccak256(raw), "from": sender, "to": to, "nonce": nonce, "gas_price": gas_price,
+        "gas": gas, "shard": shard, "to_shard": to_shard, "value": value, "data": data,
+        "v": v, "r": r, "s": s, "chain_id": chain_id,
+    }
+
+
+def decode_staking_transaction(raw: bytes) -> dict:
+    """
+    Decode a signed staking transaction:
+        [directive, stakeMsg, nonce, gasPrice, gasLimit, v, r, s]
+    """
+    fields = rlp_decode(raw)
+    if not isinstance(fields, list) or len(fields) != 8 or not isinstance(fields[1], list):
+        raise ValueError("Not a Harmony staking transaction")
+    directive = big_endian_to_int(fields[0])
+    if directive not in STAKING_DIRECTIVES:
+        raise ValueError(f"Unknown staking directive {directive}")
+    nonce, gas_price, gas = (big_endian_to_int(f) for f in fields[2:5])
+    v, r, s = (big_endian_to_int(f) for f in fields[5:])
+    chain_fields = [] if v in (27, 28) else [(v - 35) // 2, 0, 0]
+    sender, chain_id = _signer(keccak256(rlp_encode(fields[:5] + chain_fields)), v, r, s)
+    return {
+        "hash": keccak256(raw), "from": sender, "directive": directive, "msg": fields[1], "nonce": nonce,
+        "gas_price": gas_price, "gas": gas, "v": v, "r": r, "s": s, "chain_id": chain_id,
+    }
+
+
+def _bls_keys(item) -> list:
+    if isinstance(item, list):
+        return [k for k in item if isinstance(k, bytes) and len(k) == 48]
+    return [item] if isinstance(item, bytes) and len(item) == 48 else []
+
+
+class Shard:
+    def __init__(self, shard_id):
+        self.shard_id = shard_id
+        self.blocks = deque()  # Latest blocks only, see Chain.max_blocks.
+        self.block_by_hash = {}
+        self.balances = {}
+        self.nonces = {}
+        self.pending = []
+        self.incoming_cx = []
+        self.transactions = {}
+        self.receipts = {}
+        self.cx_receipts = {}
+        self.outgoing_cx = {}
+
+    @property
+    def head(self) -> dict:
+        return self.blocks[-1]
+
+    @property
+    def height(self) -> int:
+        """
+        Number of blocks produced, pruned ones included.
+        """
+        return self.blocks[-1]["number"] + 1 if self.blocks else 0
+
+    def block(self, number):
+        """
+        Block by number, None if it is not produced yet or was pruned.
+        """
+        index = number - self.blocks[0]["number"]
+        return self.blocks[index] if 0 <= index < len(self.blocks) else None
+
+
+class Chain:
+    """
+    All shards share a single lock so that cross-shard & staking flows stay consistent.
+    """
+
+    def __init__(self, num_shards, blocks_per_epoch=5, block_reward=ONE, filter_timeout=300,
+                 max_block_txs=1000, host="localhost", base_port=9500, max_blocks=10000, chain_id=2):
+        self.lock = threading.RLock()
+        self.num_shards = num_shards
+        self.blocks_per_epoch = blocks_per_epoch
+        self.block_reward = block_reward
+        self.filter_timeout = filter_timeout
+        self.max_block_txs = max_block_txs
+        self.max_blocks = max_blocks
+        self.chain_id = chain_id
+        self.host = host
+        self.base_port = base_port
+        self.shards = [Shard(i) for i in range(num_shards)]
+        self.validators = {}
+        self.filters = {}
+        self.gas_price = 1
+        for shard in self.shards:
+            self._seal_block(shard, [], [])
+
+    # ==== State transitions ====
+
+    def fund(self, address: bytes, amount: int) -> None:
+        with self.lock:
+            for shard in self.shards:
+                shard.balances[address] = shard.balances.get(address, 0) + amount
+
+    def epoch(self, shard_id=BEACON_SHARD) -> int:
+        return self.shards[shard_id].height // self.blocks_per_epoch
+
+    def _seal_block(self, shard, txs, staking_txs) -> dict:
+        number = shard.height
+        parent = shard.head["hash"] if shard.blocks else b'\x00' * 32
+        timestamp = int(time.time())
+        block_hash = keccak256(rlp_encode([shard.shard_id, number, parent, int(time.time() * 1e6),
+                                           [t["hash"] for t in txs + staking_txs]]))
+        block = {
+            "number": number, "hash": block_hash, "parent": parent, "timestamp": timestamp,
+            "epoch": number // self.blocks_per_epoch, "transactions": txs, "staking_transactions": staking_txs,
+            "gas_used": sum(t["gas_used"] for t in txs + staking_txs), "cx_hashes": [],
+        }
+        for i, txn in enumerate(txs + staking_txs):
+            txn.update(block_hash=block_hash, block_number=number, index=i if i < len(txs) else i - len(txs),
+                       timestamp=timestamp)
+        shard.blocks.append(block)
+        shard.block_by_hash[block_hash] = block
+        while len(shard.blocks) > self.max_blocks:
+            self._prune(shard, shard.blocks.popleft())
+        return block
+
+    @staticmethod
+    def _prune(shard, block) -> None:
+        """
+        Forget a block dropped from the window, with its transactions and the CX receipts it delivered.
+        """
+        del shard.block_by_hash[block["hash"]]
+        for txn in block["transactions"] + block["staking_transactions"]:
+            shard.transactions.pop(txn["hash"], None)
+            shard.outgoing_cx.pop(txn["hash"], None)
+        for cx_hash in block["cx_hashes"]:
+            shard.cx_receipts.pop(cx_hash, None)
+
+    def _apply_transaction(self, shard, txn) -> bool:
+        sender = txn["from"]
+        fee = txn["gas_price"] * BASE_TX_GAS
+        if shard.nonces.get(sender, 0) != txn["nonce"]:
+            return False
+        if shard.balances.get(sender, 0) < txn["value"] + fee:
+            return False
+        shard.nonces[sender] = txn["nonce"] + 1
+        shard.balances[sender] -= txn["value"] + fee
+        txn["gas_used"] = BASE_TX_GAS
+        if txn["to_shard"] == shard.shard_id:
+            shard.balances[txn["to"]] = shard.balances.get(txn["to"], 0) + txn["value"]
+        else:
+            shard.outgoing_cx[txn["hash"]] = txn
+            self.shards[txn["to_shard"]].incoming_cx.append(txn)
+        return True
+
+    def _bls_keys_available(self, keys) -> bool:
+        """
+        False if a key is repeated or already used by a validator (a slot key belongs to one validator only).
+        """
+        used = {key for validator in self.validators.values() for key in validator["bls_keys"]}
+        return len(set(keys)) == len(keys) and not used.intersection(keys)
+
+    def _apply_staking(self, shard, txn) -> bool:
+        sender, msg = txn["from"], txn["msg"]
+        gas = STAKING_TX_GAS + STAKING_KEY_GAS * sum(len(_bls_keys(el)) for el in msg)
+        fee = txn["gas_price"] * gas
+        if shard.nonces.get(sender, 0) != txn["nonce"] or shard.balances.get(sender, 0) < fee:
+            return False
+        directive = STAKING_DIRECTIVES[txn["directive"]]
+        try:
+            if directive == "CreateValidator":
+                amount = big_endian_to_int(msg[-1])
+                if msg[0] != sender or sender in self.validators or shard.balances[sender] < amount + fee:
+                    return False
+                if not self._bls_keys_available(_bls_keys(msg[5])):
+                    return False
+                self.validators[sender] = {
+                    "description": [el.decode(errors="replace") for el in msg[1]],
+                    "rates": [big_endian_to_int(el) for el in msg[2]],
+                    "min_self_delegation": big_endian_to_int(msg[3]),
+                    "max_total_delegation": big_endian_to_int(msg[4]),
+                    "bls_keys": _bls_keys(msg[5]),
+                    "creation_height": shard.height,
+                    "delegations": {sender: {"amount": amount, "reward": 0, "undelegations": []}},
+                }
+                shard.balances[sender] -= amount
+            elif directive == "EditValidator":
+                validator = self.validators.get(msg[0])
+                if msg[0] != sender or validator is None:
+                    return False
+                description, removed, added = msg[1], _bls_keys(msg[5]), _bls_keys(msg[6])
+                if not self._bls_keys_available([k for k in added if k not in validator["bls_keys"]]):
+                    return False
+                validator["description"] = [el.decode(errors="replace") for el in description]
+                for key in removed:
+                    if key in validator["bls_keys"]:
+                        validator["bls_keys"].remove(key)
+                validator["bls_keys"].extend(k for k in added if k not in validator["bls_keys"])
+            elif directive in ("Delegate", "Undelegate"):
+                delegator, amount = msg[0], big_endian_to_int(msg[2])
+                validator = self.validators.get(msg[1])
+                if delegator != sender or validator is None:
+                    return False
+                # Validate before touching state so a rejected txn leaves no empty delegation behind.
+                delegation = validator["delegations"].get(delegator)
+                if directive == "Delegate":
+                    if shard.balances[sender] < amount + fee:
+                        return False
+                    delegation = validator["delegations"].setdefault(
+                        delegator, {"amount": 0, "reward": 0, "undelegations": []})
+                    shard.balances[sender] -= amount
+                    delegation["amount"] += amount
+                else:
+                    if delegation is None or delegation["amount"] < amount:
+                        return False
+                    delegation["amount"] -= amount
+                    delegation["undelegations"].append({"amount": amount, "epoch": self.epoch()})
+            elif directive == "CollectRewards":
+                if msg[0] != sender:
+                    return False
+                delegations = [v["delegations"][sender] for v in self.validators.values()
+                               if v["delegations"].get(sender, {}).get("reward")]
+                if not delegations:
+                    return False
+                for delegation in delegations:
+                    shard.balances[sender] += delegation["reward"]
+                    delegation["reward"] = 0
+        except (IndexError, KeyError, TypeError, AttributeError):
+            return False  # Malformed staking message.
+        shard.nonces[sender] = txn["nonce"] + 1
+        shard.balances[sender] -= fee
+        txn["gas_used"] = gas
+        return True
+
+    def _distribute_rewards(self, shard) -> None:
+        delegations = [d for v in self.validators.values() for d in v["delegations"].values() if d["amount"]]
+        total = sum(d["amount"] for d in delegations)
+        for delegation in delegations:
+            delegation["reward"] += self.block_reward * delegation["amount"] // total
+        epoch = self.epoch()
+        for validator in self.validators.values():
+            for delegator, delegation in validator["delegations"].items():
+                unlocked = [u for u in delegation["undelegations"] if epoch - u["epoch"] >= UNDELEGATION_LOCK_EPOCHS]
+                for undelegation in unlocked:
+                    delegation["undelegations"].remove(undelegation)
+                    shard.balances[delegator] = shard.balances.get(delegator, 0) + undelegation["amount"]
+
+    def produce_block(self, shard_id) -> dict:
+        with self.lock:
+            shard = self.shards[shard_id]
+            for cx in shard.incoming_cx:
+                shard.balances[cx["to"]] = shard.balances.get(cx["to"], 0) + cx["value"]
+            delivered, shard.incoming_cx = shard.incoming_cx, []
+
+            candidates, shard.pending = shard.pending[:self.max_block_txs], shard.pending[self.max_block_txs:]
+            txs, staking_txs = [], []
+            for txn in sorted(candidates, key=lambda t: t["nonce"]):
+                if txn["nonce"] > shard.nonces.get(txn["from"], 0):
+                    shard.pending.append(txn)  # Future nonce, keep it until the gap is filled.
+                elif "directive" in txn:
+                    if self._apply_staking(shard, txn):
+                        staking_txs.append(txn)
+                elif self._apply_transaction(shard, txn):
+                    txs.append(txn)
+            if shard_id == BEACON_SHARD and self.validators:
+                self._distribute_rewards(shard)
+
+            block = self._seal_block(shard, txs, staking_txs)
+            for txn in txs + staking_txs:
+                shard.transactions[txn["hash"]] = txn
+            for cx in delivered:
+                cx["cx_block_hash"], cx["cx_block_number"] = block["hash"], block["number"]
+                shard.cx_receipts[cx["hash"]] = cx
+                block["cx_hashes"].append(cx["hash"])
+
+            now = time.time()
+            for filter_id, fltr in list(self.filters.items()):
+                if now - fltr["last_poll"] > self.filter_timeout:
+                    del self.filters[filter_id]
+                elif fltr["shard"] == shard_id and fltr["type"] == "block":
+                    fltr["changes"].append(_bytes_hex(block["hash"]))
+            return block
+
+    def submit(self, shard_id, txn) -> None:
+        with self.lock:
+            shard = self.shards[shard_id]
+            if txn["hash"] in shard.transactions or any(t["hash"] == txn["hash"] for t in shard.pending):
+                raise RpcError("already known")
+            if txn["chain_id"] != self.chain_id:
+                raise RpcError(f"invalid chain id {txn['chain_id']}, expected {self.chain_id}")
+            if "directive" in txn and shard_id != BEACON_SHARD:
+                raise RpcError("staking transactions must be sent to the beacon shard")
+            if "directive" not in txn:
+                if txn["shard"] != shard_id:
+                    raise RpcError(f"transaction for shard {txn['shard']} sent to shard {shard_id}")
+                if not 0 <= txn["to_shard"] < self.num_shards:
+                    raise RpcError(f"invalid destination shard {txn['to_shard']}")
+            if txn["nonce"] < shard.nonces.get(txn["from"], 0):
+                raise RpcError("nonce too low")
+            shard.pending.append(txn)
+            for fltr in self.filters.values():
+                if fltr["shard"] == shard_id and fltr["type"] == "pending":
+                    fltr["changes"].append(_bytes_hex(txn["hash"]))
+
+    # ==== Formatting ====
+
+    def format_transaction(self, txn) -> dict:
+        base = {
+            "blockHash": _bytes_hex(txn.get("block_hash", b'\x00' * 32)),
+            "blockNumber": _hex(txn["block_number"]) if "block_number" in txn else None,
+            "from": to_one_address(txn["from"]),
+            "gas": _hex(txn["gas"]),
+            "gasPrice": _hex(txn["gas_price"]),
+            "hash": _bytes_hex(txn["hash"]),
+            "nonce": _hex(txn["nonce"]),
+            "transactionIndex": _hex(txn.get("index", 0)),
+            "timestamp": _hex(txn.get("timestamp", 0)),
+            "v": _hex(txn["v"]), "r": _hex(txn["r"]), "s": _hex(txn["s"]),
+        }
+        if "directive" in txn:
+            base.update(type=STAKING_DIRECTIVES[txn["directive"]], msg=_jsonable(txn["msg"]))
+        else:
+            base.update(to=to_one_address(txn["to"]), value=_hex(txn["value"]), input=_bytes_hex(txn["data"]),
+                        shardID=txn["shard"], toShardID=txn["to_shard"])
+        return base
+
+    def format_receipt(self, txn) -> dict:
+        receipt = {
+            "blockHash": _bytes_hex(txn["block_hash"]),
+            "blockNumber": _hex(txn["block_number"]),
+            "contractAddress": None,
+            "cumulativeGasUsed": _hex(txn["gas_used"]),
+            "from": to_one_address(txn["from"]),
+            "gasUsed": _hex(txn["gas_used"]),
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": _hex(1),
+            "transactionHash": _bytes_hex(txn["hash"]),
+            "transactionIndex": _hex(txn["index"]),
+        }
+        if "directive" not in txn:
+            receipt.update(to=to_one_address(txn["to"]), shardID=txn["shard"])
+        return receipt
+
+    def format_block(self, shard, block, full_txs) -> dict:
+        txs = [self.format_transaction(t) if full_txs else _bytes_hex(t["hash"]) for t in block["transactions"]]
+        staking = [self.format_transaction(t) if full_txs else _bytes_hex(t["hash"])
+                   for t in block["staking_transactions"]]
+        return {
+            "difficulty": 0, "extraData": "0x", "gasLimit": _hex(80000000), "gasUsed": _hex(block["gas_used"]),
+            "hash": _bytes_hex(block["hash"]), "logsBloom": "0x" + "00" * 256,
+            "miner": to_one_address(b'\x00' * 20), "mixHash": "0x" + "00" * 32, "nonce": 0,
+            "number": _hex(block["number"]), "parentHash": _bytes_hex(block["parent"]),
+            "receiptsRoot": "0x" + "00" * 32, "size": _hex(500 + 200 * (len(txs) + len(staking))),
+            "stakingTransactions": staking, "stateRoot": "0x" + "00" * 32, "timestamp": _hex(block["timestamp"]),
+            "transactions": txs, "transactionsRoot": "0x" + "00" * 32, "uncles": [],
+            "epoch": _hex(block["epoch"]), "shardID": shard.shard_id, "viewID": _hex(block["number"]),
+        }
+
+    def format_validator(self, address) -> dict:
+        validator = self.validators[address]
+        name, identity, website, security_contact, details = (validator["description"] + [""] * 5)[:5]
+        rate, max_rate, max_change_rate = (validator["rates"] + [0] * 3)[:3]
+        return {
+            "validator": {
+                "address": to_one_address(address),
+                "bls-public-keys": [k.hex() for k in validator["bls_keys"]],
+                "name": name, "identity": identity, "website": website,
+                "security-contact": security_contact, "details": details,
+                "rate": f"{rate / ONE:.18f}", "max-rate": f"{max_rate / ONE:.18f}",
+                "max-change-rate": f"{max_change_rate / ONE:.18f}",
+                "min-self-delegation": validator["min_self_delegation"],
+                "max-total-delegation": validator["max_total_delegation"],
+                "creation-height": validator["creation_height"],
+                "delegations": [self.format_delegation(address, d) for d in validator["delegations"]],
+            },
+            "currently-in-committee": True,
+            "epos-status": "currently elected",
+            "total-delegation": sum(d["amount"] for d in validator["delegations"].values()),
+        }
+
+    def format_delegation(self, validator_address, delegator_address) -> dict:
+        delegation = self.validators[validator_address]["delegations"][delegator_address]
+        return {
+            "validator_address": to_one_address(validator_address),
+            "delegator_address": to_one_address(delegator_address),
+            "amount": delegation["amount"],
+            "reward": delegation["reward"],
+            "Undelegations": [{"Amount": u["amount"], "Epoch": u["epoch"]} for u in delegation["undelegations"]],
+        }
+
+
+def _jsonable(item):
+    if isinstance(item, list):
+        return [_jsonable(el) for el in item]
+    return _bytes_hex(item)
+
+
+class RpcHandlers:
+    """
+    JSON-RPC methods of a single shard endpoint. Methods are looked up by name, with the
+    'hmy_' / 'net_' prefix replaced by 'rpc_'.
+    """
+
+    def __init__(self, chain: Chain, shard_id: int):
+        self.chain = chain
+        self.shard_id = shard_id
+
+    @property
+    def shard(self) -> Shard:
+        return self.chain.shards[self.shard_id]
+
+    def dispatch(self, method, params):
+        name = method.split("_", 1)[-1] if method.startswith(("hmy_", "net_")) else None
+        handler = getattr(self, f"rpc_{name}", None) if name else None
+        if handler is None:
+            raise RpcError(f"the method {method} does not exist/is not available", code=-32601)
+        if not isinstance(params, list):
+            raise RpcError(f"Invalid params for {method}: expected an array of positional params", code=-32602)
+        with self.chain.lock:
+            try:
+                return handler(*params)
+            except (TypeError, ValueError, KeyError, IndexError, AttributeError) as err:
+                raise RpcError(f"Invalid params for {method}: {err!r}", code=-32602) from err
+
+    def _block(self, number):
+        if number in ("latest", "pending", None):
+            return self.shard.head
+        if number == "earliest":
+            return self.shard.blocks[0]
+        try:
+            index = int(number, 16) if isinstance(number, str) else int(number)
+            return self.shard.block(index)
+        except ValueError as err:
+            raise RpcError(f"Invalid block number: {number}", code=-32602) from err
+
+    # ==== Chain ====
+
+    def rpc_version(self):
+        return str(self.chain.chain_id)
+
+    def rpc_peerCount(self):
+        return _hex(self.chain.num_shards - 1)
+
+    def rpc_protocolVersion(self):
+        return _hex(1)
+
+    def rpc_syncing(self):
+        return False
+
+    def rpc_gasPrice(self):
+        return _hex(self.chain.gas_price)
+
+    def rpc_blockNumber(self):
+        return _hex(self.shard.head["number"])
+
+    def rpc_latestHeader(self):
+        head = self.shard.head
+        return {
+            "blockHash": _bytes_hex(head["hash"]), "blockNumber": head["number"], "shardID": self.shard_id,
+            "leader": to_one_address(b'\x00' * 20), "viewID": head["number"], "epoch": head["epoch"],
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S +0000 UTC", time.gmtime(head["timestamp"])),
+            "unixtime": head["timestamp"], "lastCommitSig": "", "lastCommitBitmap": "", "crossLinks": [],
+        }
+
+    def rpc_getShardingStructure(self):
+        return [{"current": i == self.shard_id, "shardID": i,
+                 "http": f"http://{self.chain.host}:{self.chain.base_port + i}",
+                 "ws": f"ws://{self.chain.host}:{self.chain.base_port + 300 + i}"}
+                for i in range(self.chain.num_shards)]
+
+    def rpc_getBlockByNumber(self, number, full_txs=False):
+        block = self._block(number)
+        return self.chain.format_block(self.shard, block, full_txs) if block else None
+
+    def rpc_getBlockByHash(self, block_hash, full_txs=False):
+        block = self.shard.block_by_hash.get(_parse_hash(block_hash))
+        return self.chain.format_block(self.shard, block, full_txs) if block else None
+
+    def rpc_getBlockTransactionCountByNumber(self, number):
+        block = self._block(number)
+        return _hex(len(block["transactions"])) if block else None
+
+    def rpc_getBlockTransactionCountByHash(self, block_hash):
+        block = self.shard.block_by_hash.get(_parse_hash(block_hash))
+        return _hex(len(block["transactions"])) if block else None
+
+    def rpc_getTransactionByBlockNumberAndIndex(self, number, index):
+        block = self._block(number)
+        index = int(index, 16) if isinstance(index, str) else index
+        if not block or not 0 <= index < len(block["transactions"]):
+            return None
+        return self.chain.format_transaction(block["transactions"][index])
+
+    def rpc_getTransactionByBlockHashAndIndex(self, block_hash, index):
+        block = self.shard.block_by_hash.get(_parse_hash(block_hash))
+        return self.rpc_getTransactionByBlockNumberAndIndex(block["number"], index) if block else None
+
+    # ==== Accounts ====
+
+    def rpc_getBalance(self, address, _block="latest"):
+        return _hex(self.shard.balances.get(_parse_address(address), 0))
+
+    def rpc_getTransactionCount(self, address, block="latest"):
+        sender = _parse_address(address)
+        nonce = self.shard.nonces.get(sender, 0)
+        if block == "pending":
+            nonce += sum(1 for t in self.shard.pending if t["from"] == sender)
+        return _hex(nonce)
+
+    def rpc_getCode(self, _address, _block="latest"):
+        return "0x"
+
+    def rpc_getStorageAt(self, _address, _key, _block="latest"):
+        return "0x" + "00" * 32
+
+    def rpc_call(self, _args, _block="latest"):
+        return "0x"
+
+    def rpc_estimateGas(self, _args, _block="latest"):
+        return _hex(BASE_TX_GAS)
+
+    # ==== Transactions ====
+
+    def rpc_sendRawTransaction(self, raw):
+        try:
+            txn = decode_transaction(_parse_hash(raw))
+        except ValueError as err:
+            raise RpcError(f"could not decode transaction: {err}", code=-32602) from err
+        self.chain.submit(self.shard_id, txn)
+        return _bytes_hex(txn["hash"])
+
+    def rpc_sendRawStakingTransaction(self, raw):
+        try:
+            txn = decode_staking_transaction(_parse_hash(raw))
+        except ValueError as err:
+            raise RpcError(f"could not decode staking transaction: {err}", code=-32602) from err
+        self.chain.submit(self.shard_id, txn)
+        return _bytes_hex(txn["hash"])
+
+    def _transaction(self, tx_hash, staking):
+        tx_hash = _parse_hash(tx_hash)
+        txn = self.shard.transactions.get(tx_hash)
+        if txn is None:
+            txn = next((t for t in self.shard.pending if t["hash"] == tx_hash), None)
+        if txn is None or ("directive" in txn) != staking:
+            return None
+        return self.chain.format_transaction(txn)
+
+    def rpc_getTransactionByHash(self, tx_hash):
+        return self._transaction(tx_hash, staking=False)
+
+    def rpc_getStakingTransactionByHash(self, tx_hash):
+        return self._transaction(tx_hash, staking=True)
+
+    def rpc_getTransactionReceipt(self, tx_hash):
+        txn = self.shard.transactions.get(_parse_hash(tx_hash))
+        return self.chain.format_receipt(txn) if txn else None
+
+    def rpc_getCXReceiptByHash(self, tx_hash):
+        cx = self.shard.cx_receipts.get(_parse_hash(tx_hash))
+        if cx is None:
+            return None
+        return {
+            "blockHash": _bytes_hex(cx["cx_block_hash"]), "blockNumber": _hex(cx["cx_block_number"]),
+            "hash": _bytes_hex(cx["hash"]), "from": to_one_address(cx["from"]), "to": to_one_address(cx["to"]),
+            "shardID": cx["shard"], "toShardID": cx["to_shard"], "value": _hex(cx["value"]),
+        }
+
+    def rpc_resendCx(self, tx_hash):
+        tx_hash = _parse_hash(tx_hash)
+        cx = self.shard.outgoing_cx.get(tx_hash)
+        return cx is not None and tx_hash not in self.chain.shards[cx["to_shard"]].cx_receipts
+
+    def rpc_pendingTransactions(self):
+        return [self.chain.format_transaction(t) for t in self.shard.pending if "directive" not in t]
+
+    # ==== Filters ====
+
+    def _new_filter(self, filter_type):
+        filter_id = _bytes_hex(os.urandom(16))
+        self.chain.filters[filter_id] = {"type": filter_type, "shard": self.shard_id,
+                                         "changes": [], "last_poll": time.time()}
+        return filter_id
+
+    def rpc_newFilter(self, _criteria):
+        return self._new_filter("logs")
+
+    def rpc_newBlockFilter(self):
+        return self._new_filter("block")
+
+    def rpc_newPendingTransactionFilter(self):
+        return self._new_filter("pending")
+
+    def rpc_getFilterChanges(self, filter_id):
+        fltr = self.chain.filters.get(filter_id)
+        if fltr is None:
+            raise RpcError("filter not found")
+        changes, fltr["changes"] = fltr["changes"], []
+        fltr["last_poll"] = time.time()
+        return changes
+
+    def rpc_uninstallFilter(self, filter_id):
+        return self.chain.filters.pop(filter_id, None) is not None
+
+    def rpc_getLogs(self, _criteria):
+        return []  # No contracts, so no logs.
+
+    # ==== Staking (beacon shard data, served from every shard) ====
+
+    def rpc_getAllValidatorAddresses(self):
+        return [to_one_address(a) for a in self.chain.validators]
+
+    def rpc_getActiveValidatorAddresses(self):
+        return [to_one_address(a) for a, v in self.chain.validators.items() if v["bls_keys"]]
+
+    def rpc_getElectedValidatorAddresses(self):
+        return self.rpc_getActiveValidatorAddresses()
+
+    def rpc_getValidatorInformation(self, address):
+        address = _parse_address(address)
+        if address not in self.chain.validators:
+            raise RpcError(f"validator not found: {to_one_address(address)}")
+        return self.chain.format_validator(address)
+
+    def rpc_getDelegationsByValidator(self, address):
+        address = _parse_address(address)
+        if address not in self.chain.validators:
+            return []
+        return [self.chain.format_delegation(address, d) for d in self.chain.validators[address]["delegations"]]
+
+    def rpc_getDelegationsByDelegator(self, address):
+        address = _parse_address(address)
+        return [self.chain.format_delegation(v, address) for v, validator in self.chain.validators.items()
+                if address in validator["delegations"]]
+
+    def rpc_getStakingNetworkInfo(self):
+        total = sum(d["amount"] for v in self.chain.validators.values() for d in v["delegations"].values())
+        return {"total-staking": total, "median-raw-stake": "0", "epoch-last-block": self.chain.blocks_per_epoch}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Bursts of new connections from load tests.
+
+
+def make_request_handler(handlers: RpcHandlers):
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # Headers and body are separate writes.
+
+        def log_message(self, *_):
+            pass  # Too noisy under load.
+
+        def _single(self, request):
+            if not isinstance(request, dict) or "method" not in request:
+                return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid request"}}
+            response = {"jsonrpc": "2.0", "id": request.get("id")}
+            params = request.get("params")
+            try:
+                response["result"] = handlers.dispatch(request["method"], [] if params is None else params)
+            except RpcError as err:
+                response["error"] = {"code": err.code, "message": err.message}
+            except Exception as err:  # Never drop the connection without a response.
+                response["error"] = {"code": -32603, "message": f"Internal error: {err!r}"}
+            return response
+
+        def do_POST(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                response = [self._single(r) for r in body] if isinstance(body, list) else self._single(body)
+            except (json.JSONDecodeError, UnicodeDecodeError, ValueError):
+                response = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}
+            data = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return RequestHandler
+
+
+class Simulator:
+    """
+    Owns the servers and block producer threads, usable in-process by other scripts:
+
+        sim = Simulator(Chain(num_shards=2), block_time_ms=50)
+        sim.start()
+        ...
+        sim.stop()
+    """
+
+    def __init__(self, chain: Chain, block_time_ms=1000):
+        self.chain = chain
+        self.block_time = block_time_ms / 1000
+        self.stop_event = threading.Event()
+        self.servers = []
+        self.threads = []
+
+    @property
+    def endpoints(self) -> list:
+        return [f"http://{self.chain.host}:{self.chain.base_port + i}/" for i in range(self.chain.num_shards)]
+
+    def _producer(self, shard_id):
+        next_block = time.time() + self.block_time
+        while not self.stop_event.wait(max(0.0, next_block - time.time())):
+            self.chain.produce_block(shard_id)
+            next_block += self.block_time
+
+    def start(self) -> None:
+        for shard_id in range(self.chain.num_shards):
+            server = _Server((self.chain.host, self.chain.base_port + shard_id),
+                             make_request_handler(RpcHandlers(self.chain, shard_id)))
+            self.servers.append(server)
+            self.threads.append(threading.Thread(target=server.serve_forever, daemon=True))
+            self.threads.append(threading.Thread(target=self._producer, args=(shard_id,), daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+def load_genesis_addresses(keys_dir) -> list:
+    """
+    Addresses of all CLI formatted key files (json with an 'address' field) under keys_dir.
+    """
+    addresses = []
+    for root, _, files in os.walk(keys_dir):
+        for file_name in files:
+            if not file_name.endswith(".key"):
+                continue
+            try:
+                with open(os.path.join(root, file_name), 'r') as f:
+                    addresses.append(bytes.fromhex(json.load(f)["address"]))
+            except (json.JSONDecodeError, KeyError, ValueError):
+                print(f"[!] Skipping unrecognized key file: {os.path.join(root, file_name)}")
+    return addresses
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    chain = Chain(args.num_shards, blocks_per_epoch=args.blocks_per_epoch, block_reward=int(args.block_reward * ONE),
+                  filter_timeout=args.filter_timeout, max_block_txs=args.max_block_txs, host=args.host,
+                  base_port=args.base_port, max_blocks=args.max_blocks, chain_id=args.chain_id)
+    genesis = load_genesis_addresses(args.keys_dir) if os.path.isdir(args.keys_dir) else []
+    genesis.extend(from_one_address(addr) for addr in args.fund)
+    for addr in set(genesis):
+        chain.fund(addr, int(args.genesis_balance * ONE))
+    print(f"Funded {len(set(genesis))} address(es) with {args.genesis_balance} ONE on each shard")
+
+    sim = Simulator(chain, block_time_ms=args.block_time_ms)
+    sim.start()
+    print(f"Simulating {args.num_shards} shard(s) with {args.block_time_ms}ms blocks:")
+    for endpoint in sim.endpoints:
+        print(f"\t{endpoint}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopping simulator...")
+        sim.stop()
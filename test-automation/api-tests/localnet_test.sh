@@ -5,8 +5,9 @@ delay=25
 iters=20
 wait=120
 doStaking=false
+useSim=false
 
-while getopts hw:d:i:s option
+while getopts hw:d:i:sm option
 do 
  case "${option}" 
  in
@@ -14,6 +15,7 @@ do
  d) delay=${OPTARG};;
  i) iters=${OPTARG};;
  s) doStaking=true;;
+ m) useSim=true;;
  h) echo "Options:"
     echo ""
     echo "  Example: ./localnet_test.sh -w 0 -d 30 -i 5 -s"
@@ -22,11 +24,18 @@ do
     echo "    -d <int>  Cx delay (in seconds) between send and check for tests. Default is 30 seconds."
     echo "    -i <int>  Max number of iterations before success. Default is 20."
     echo "    -s        Toggle (on) staking test. "
+    echo "    -m        Run against the in-process chain simulator (localnet_sim.py) instead of a localnet."
     echo "    -h        Help."
     exit 0 ;; 
  esac 
 done 
 
+if [ "$useSim" == "true" ]; then
+    python3 localnet_sim.py --num_shards=2 --block_time_ms=500 --keystore=./LocalnetValidatorKeys/ &
+    sim_pid=$!
+    trap "kill $sim_pid" EXIT
+fi
+
 until $(curl --silent --location --request POST "localhost:9500" \
    --header "Content-Type: application/json" \
    --data '{"jsonrpc":"2.0","method":"net_version","params":[],"id":1}' > /dev/null)
@@ -0,0 +1,193 @@
+"""
+Prometheus metrics of the test drivers, with an optional embedded /metrics server.
+
+Observations are aggregated per thread (no lock on the hot path), the per-thread shards are
+only summed when /metrics is scraped. Shards of finished threads (e.g. short lived pool workers)
+are folded into a shared shard, so memory does not grow with the number of threads ever started.
+The metric objects are module level so that any driver or helper can observe into them, the
+server only has to be started to expose them:
+
+    import metrics
+    metrics.start_server(9900)  # Localhost only, pass host="0.0.0.0" to expose it.
+    metrics.RPC_LATENCY.observe(0.012, "hmy_getBalance")
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FINALITY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 300)
+
+_REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra="") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _PerThread:
+    """
+    Base of the metrics: each thread writes to its own dict, registered once per thread.
+    """
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._local = threading.local()
+        self._shards = {}  # thread -> shard
+        self._retired = {}  # Folded shards of finished threads.
+        self._shards_lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._fold_finished()
+                self._shards[threading.current_thread()] = shard
+            return shard
+
+    def _fold_finished(self) -> None:
+        """
+        Merge the shards of finished threads into the retired shard, the lock must be held.
+        A finished thread can no longer write to its shard so no observation is lost.
+        """
+        for thread in [t for t in self._shards if not t.is_alive()]:
+            for labels, value in self._shards.pop(thread).items():
+                self._retired[labels] = self._merge(self._retired.get(labels), value)
+
+    def _merge(self, total, value):
+        raise NotImplementedError
+
+    def _snapshots(self) -> list:
+        with self._shards_lock:
+            self._fold_finished()
+            shards = list(self._shards.values())
+            shards.append(dict(self._retired))
+        return [dict(shard) for shard in shards]
+
+
+class Counter(_PerThread):
+    def inc(self, *label_values, amount=1) -> None:
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def _merge(self, total, value):
+        return value if total is None else total + value
+
+    def collect(self) -> list:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in sorted(totals.items()))
+        return lines
+
+
+class Histogram(_PerThread):
+    def __init__(self, name, documentation, label_names, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values) -> None:
+        shard = self._shard()
+        state = shard.get(label_values)
+        if state is None:
+            state = shard[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def _merge(self, total, value):
+        # New lists, so snapshots taken before the merge are left untouched.
+        if total is None:
+            return [list(value[0]), value[1]]
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1]]
+
+    def collect(self) -> list:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, (counts, total) in shard.items():
+                merged = totals.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += count
+                bucket_labels = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+RPC_LATENCY = Histogram("hmy_test_rpc_latency_seconds", "JSON-RPC call latency per method.", ["method"])
+CLI_DURATION = Histogram("hmy_test_cli_duration_seconds", "CLI subprocess duration per sub-command.", ["command"])
+FINALITY = Histogram("hmy_test_finality_seconds", "Time from sending a transaction to its inclusion.",
+                     ["step"], buckets=FINALITY_BUCKETS)
+NEWMAN_ITEM = Histogram("hmy_test_newman_item_seconds", "Response time of newman collection items.", ["item"])
+TEST_DURATION = Histogram("hmy_test_test_duration_seconds", "Duration of each test function.", ["test"],
+                          buckets=FINALITY_BUCKETS)
+RETRIES = Counter("hmy_test_retries_total", "Retried steps.", ["step"])
+FAILURES = Counter("hmy_test_failures_total", "Failed calls/steps.", ["kind", "name"])
+CHECKS = Counter("hmy_test_canary_checks_total", "Canary checks by result ('ok' or 'failed').", ["check", "result"])
+
+_TIMINGS = {
+    "rpc": RPC_LATENCY,
+    "cli": CLI_DURATION,
+    "finality": FINALITY,
+    "newman": NEWMAN_ITEM,
+    "test": TEST_DURATION,
+}
+
+
+def observe_timing(category, name, seconds) -> None:
+    """
+    Same categories as the results store (results_store.py), unknown categories are ignored.
+    """
+    histogram = _TIMINGS.get(category)
+    if histogram is not None:
+        histogram.observe(seconds, name)
+
+
+def render() -> str:
+    return "\n".join(line for metric in _REGISTRY for line in metric.collect()) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        data = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(port, host="127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve /metrics from a daemon thread, returns the server (call shutdown() to stop it).
+    Binds to localhost unless another host (e.g. "0.0.0.0") is given.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Historical performance results of the test drivers, kept in a local sqlite database.
+
+Each run is keyed by driver, CLI version, chain id and endpoint. Timings are grouped in
+categories ('rpc', 'cli', 'finality', 'newman', ...) and named by method/command/item.
+
+The report compares the latest run with the trailing runs of the same chain id & endpoint:
+  - steps with enough samples on both sides use a one sided Mann-Whitney U test,
+  - other steps compare the run median against the spread of the baseline run medians.
+Only slowdowns that are statistically significant AND above --min_slowdown are flagged.
+
+Example:
+    python3 results_store.py report --db ./perf_results.db --baseline_runs 10
+"""
+import argparse
+import math
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_DB = "./perf_results.db"
+MIN_SAMPLES = 5  # Per side, to use the rank test on raw samples.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    driver TEXT NOT NULL,
+    cli_version TEXT,
+    chain_id TEXT,
+    endpoint TEXT
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_run ON timings(run_id, category, name);
+"""
+
+
+def command_name(command) -> str:
+    """
+    Stable name of a CLI command: its leading sub-command words, without flags or arguments.
+    e.g. 'hmy --node=x staking delegate --amount 1' -> 'hmy staking delegate'
+    """
+    words = []
+    for word in command.split():
+        if word.startswith("-"):
+            continue
+        if not word.replace("-", "").isalpha():
+            break
+        words.append(word)
+    return " ".join(words)
+
+
+class ResultsStore:
+    """
+    Timings are buffered in memory (thread safe) and written in one transaction on flush/close.
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.run_id = None
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def start_run(self, driver, cli_version, chain_id, endpoint) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute("INSERT INTO runs (started, driver, cli_version, chain_id, endpoint) "
+                                  "VALUES (?, ?, ?, ?, ?)", (time.time(), driver, str(cli_version), chain_id, endpoint))
+            self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def record(self, category, name, seconds) -> None:
+        with self.lock:
+            self.buffer.append((self.run_id, category, name, float(seconds)))
+
+    @contextmanager
+    def timer(self, category, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, time.perf_counter() - start)
+
+    def flush(self) -> None:
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+        if rows and self.run_id is not None:
+            with self._connect() as conn:
+                conn.executemany("INSERT INTO timings (run_id, category, name, seconds) VALUES (?, ?, ?, ?)", rows)
+
+    def close(self) -> None:
+        self.flush()
+
+
+def mann_whitney_p(current, baseline) -> float:
+    """
+    One sided p-value (normal approximation, tie corrected) that current is stochastically larger than baseline.
+    """
+    ranked = sorted([(v, 0) for v in current] + [(v, 1) for v in baseline])
+    ranks, ties, i = [0.0] * len(ranked), 0, 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    n1, n2 = len(current), len(baseline)
+    u = sum(r for r, (_, side) in zip(ranks, ranked) if side == 0) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 1 - statistics.NormalDist().cdf(z)
+
+
+def find_regressions(conn, run_id, baseline_runs=10, alpha=0.01, min_slowdown=0.1) -> list:
+    run = conn.execute("SELECT chain_id, endpoint, driver FROM runs WHERE id = ?", (run_id,)).fetchone()
+    if run is None:
+        raise ValueError(f"Unknown run {run_id}")
+    baseline_ids = [r[0] for r in conn.execute(
+        "SELECT id FROM runs WHERE chain_id IS ? AND endpoint IS ? AND driver = ? AND id < ? "
+        "ORDER BY id DESC LIMIT ?", (*run, run_id, baseline_runs))]
+    if not baseline_ids:
+        return []
+
+    def samples(ids):
+        grouped = {}
+        query = f"SELECT run_id, category, name, seconds FROM timings WHERE run_id IN ({','.join('?' * len(ids))})"
+        for rid, category, name, seconds in conn.execute(query, ids):
+            grouped.setdefault((category, name), {}).setdefault(rid, []).append(seconds)
+        return grouped
+
+    current, baseline = samples([run_id]), samples(baseline_ids)
+    z_critical = statistics.NormalDist().inv_cdf(1 - alpha)
+    regressions = []
+    for key, by_run in sorted(current.items()):
+        if key not in baseline:
+            continue
+        now = by_run[run_id]
+        before = [v for values in baseline[key].values() for v in values]
+        slowdown = statistics.median(now) / statistics.median(before) - 1 if statistics.median(before) else 0
+        if slowdown < min_slowdown:
+            continue
+        if len(now) >= MIN_SAMPLES and len(before) >= MIN_SAMPLES:
+            p_value = mann_whitney_p(now, before)
+            significant = p_value < alpha
+        else:
+            medians = [statistics.median(values) for values in baseline[key].values()]
+            if len(medians) < 2:
+                continue
+            spread = statistics.stdev(medians) or 1e-9
+            z = (statistics.median(now) - statistics.mean(medians)) / spread
+            p_value = 1 - statistics.NormalDist().cdf(z)
+            significant = z > z_critical
+        if significant:
+            regressions.append({
+                "category": key[0], "name": key[1], "slowdown_pct": round(slowdown * 100, 1),
+                "median_s": round(statistics.median(now), 4), "baseline_median_s": round(statistics.median(before), 4),
+                "p_value": round(p_value, 5), "samples": len(now), "baseline_samples": len(before),
+            })
+    return regressions
+
+
+def report(path, run_id=None, baseline_runs=10, alpha=0.01, min_slowdown=0.1) -> list:
+    with sqlite3.connect(path) as conn:
+        if run_id is None:
+            row = conn.execute("SELECT MAX(id) FROM runs").fetchone()
+            if row[0] is None:
+                print("No runs recorded.")
+                return []
+            run_id = row[0]
+        started, driver, cli_version, chain_id, endpoint = conn.execute(
+            "SELECT started, driver, cli_version, chain_id, endpoint FROM runs WHERE id = ?", (run_id,)).fetchone()
+        print(f"Run {run_id} ({driver}) at {time.ctime(started)}\n"
+              f"\tCLI version: {cli_version}\n\tChain ID: {chain_id}\n\tEndpoint: {endpoint}")
+        regressions = find_regressions(conn, run_id, baseline_runs, alpha, min_slowdown)
+    if not regressions:
+        print(f"No significant slowdown versus the previous {baseline_runs} run(s).")
+    for reg in regressions:
+        print(f"[REGRESSION] {reg['category']}/{reg['name']}: {reg['median_s']}s vs {reg['baseline_median_s']}s "
+              f"(+{reg['slowdown_pct']}%, p={reg['p_value']}, n={reg['samples']}/{reg['baseline_samples']})")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Historical performance results of the test drivers.')
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Flag significant slowdowns of a run versus its baseline.")
+    report_parser.add_argument("--db", dest="db", default=DEFAULT_DB,
+                               help=f"Path of the results database. Default is {DEFAULT_DB}", type=str)
+    report_parser.add_argument("--run", dest="run_id", default=None,
+                               help="Run ID to check. Default is the latest run.", type=int)
+    report_parser.add_argument("--baseline_runs", dest="baseline_runs", default=10,
+                               help="Number of trailing runs (same driver, chain id & endpoint) used as baseline. "
+                                    "Default is 10.", type=int)
+    report_parser.add_argument("--alpha", dest="alpha", default=0.01,
+                               help="Significance level. Default is 0.01.", type=float)
+    report_parser.add_argument("--min_slowdown", dest="min_slowdown", default=0.1,
+                               help="Minimum relative slowdown of the median to report. Default is 0.1 (10%%).",
+                               type=float)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    found = report(args.db, args.run_id, args.baseline_runs, args.alpha, args.min_slowdown)
+    sys.exit(1 if found else 0)
@@ -8,12 +8,20 @@ import subprocess
 import shutil
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pyhmy
 import requests
 
+import metrics
+from bench import timed, wait_for, summarize, write_results, RollingStats, rss_bytes
+from keystore_journal import KeystoreJournal
+from results_store import ResultsStore, command_name
+from topology import Topology, add_observer
+
 ACC_NAMES_ADDED = []
 ACC_NAME_PREFIX = "_Test_key_"
+NEXT_SENDER = 0  # Index in ACC_NAMES_ADDED where get_raw_txn starts looking for a sender.
 
 
 def parse_args() -> argparse.Namespace:
@@ -52,15 +60,59 @@ def parse_args() -> argparse.Namespace:
                         help="Disable the regression tests.")
     parser.add_argument("--ignore_staking_test", dest="ignore_staking_test", action='store_true', default=False,
                         help="Disable the staking tests.")
+    parser.add_argument("--results_db", dest="results_db", default="./perf_results.db", type=str,
+                        help="sqlite database the run's timings are saved to (see results_store.py). "
+                             "Set to '' to disable. Default is ./perf_results.db")
+    parser.add_argument("--delegation_bench", dest="delegation_bench", default=None, type=str,
+                        help="Comma separated delegator counts (e.g. '10,100,1000'). Runs the delegation fan-out "
+                             "benchmark instead of the tests. Latencies are the CLI call (submission) time, not "
+                             "inclusion. Default is None.")
+    parser.add_argument("--bls_sweep", dest="bls_sweep", default=None, type=int,
+                        help="Max BLS key count (e.g. 106, the protocol maximum). Runs the create/edit-validator "
+                             "BLS key-count sweep (1, 2, 4, ... up to the max) instead of the tests. Default is None.")
+    parser.add_argument("--bench_validator", dest="bench_validator", default=None, type=str,
+                        help="Validator address to delegate to in benchmarks. "
+                             "Default creates validators and uses the first one found on chain.")
+    parser.add_argument("--bench_amount", dest="bench_amount", default=100, type=float,
+                        help="Amount (in ONE) delegated by each benchmark delegator. Default is 100.")
+    parser.add_argument("--bench_samples", dest="bench_samples", default=5, type=int,
+                        help="Number of measured calls per query/step in benchmarks. Default is 5.")
+    parser.add_argument("--bench_workers", dest="bench_workers", default=16, type=int,
+                        help="Number of concurrent CLI calls in benchmarks. Default is 16.")
+    parser.add_argument("--bench_output", dest="bench_output", default="./bench_results", type=str,
+                        help="Path prefix of the benchmark results (.csv and .json). Default is ./bench_results")
+    parser.add_argument("--canary_interval", dest="canary_interval", default=None, type=float,
+                        help="Run as a canary: keys and clients are set up once, then the regression collection and "
+                             "a cross-shard transfer run every CANARY_INTERVAL seconds. Default is None (single run).")
+    parser.add_argument("--canary_duration", dest="canary_duration", default=0, type=float,
+                        help="Hours to run the canary for, 0 runs until interrupted. Default is 0.")
+    parser.add_argument("--canary_window", dest="canary_window", default=100, type=int,
+                        help="Number of samples per step kept for the canary's rolling stats. Default is 100.")
+    parser.add_argument("--canary_output", dest="canary_output", default="./canary_stats.json", type=str,
+                        help="File the canary's rolling stats are (over)written to after each cycle. "
+                             "Default is ./canary_stats.json")
+    parser.add_argument("--metrics_port", dest="metrics_port", default=None, type=int,
+                        help="Port of the embedded Prometheus /metrics server (see metrics.py). "
+                             "Default is None (disabled).")
+    parser.add_argument("--metrics_host", dest="metrics_host", default="127.0.0.1", type=str,
+                        help="Address the /metrics server binds to, use 0.0.0.0 to expose it to other hosts. "
+                             "Default is 127.0.0.1")
     return parser.parse_args()
 
 
-def get_balance(name, node) -> dict:
+def get_balance(name) -> list:
+    """
+    Balance on every shard (same format as 'hmy balances'), queried in parallel from each shard's endpoint.
+    Falls back to the CLI if any shard could not be queried.
+    """
     address = CLI.get_address(name)
     if not address:
-        return {}
-    response = CLI.single_call(f"hmy balances {address} --node={node}").replace("\r", "").replace("\n", "")
-    return json.loads(response)
+        return []
+    balances = TOPOLOGY.get_balances(address)
+    if len(balances) < TOPOLOGY.num_shards:
+        response = CLI.single_call(f"hmy balances {address} --node={args.hmy_endpoint_src}")
+        balances = json.loads(response.replace("\r", "").replace("\n", ""))
+    return balances
 
 
 def load_keys() -> None:
@@ -73,6 +125,7 @@ def load_keys() -> None:
         key_content = os.listdir(f"{args.keys_dir}/{key}")
         account_name = f"{ACC_NAME_PREFIX}{random_num}_{i}"
         CLI.remove_account(account_name)
+        JOURNAL.record(account_name)
         for file_name in key_content:
             if not file_name.endswith(".key"):  # Strong assumption about key file, some valid files may be ignored.
                 continue
@@ -95,6 +148,88 @@ def load_keys() -> None:
     assert len(ACC_NAMES_ADDED) > 1, "Must load at least 2 keys and must match CLI's keystore format"
 
 
+def record_timing(category, name, seconds, ok=True) -> None:
+    metrics.observe_timing(category, name, seconds)
+    if STORE:
+        STORE.record(category, name, seconds)
+    if ROLLING:
+        ROLLING.record(f"{category} {name}", seconds, ok)
+
+
+def observe_rpc(method, seconds, error) -> None:
+    record_timing("rpc", method, seconds, ok=error is None)
+    if error is not None:
+        metrics.FAILURES.inc("rpc", method)
+
+
+def instrument_cli() -> None:
+    """
+    Time every CLI command, recorded per sub-command (e.g. 'hmy staking delegate').
+    """
+    single_call = CLI.single_call
+
+    def timed_single_call(command, *call_args, **call_kwargs):
+        name = command_name(command)
+        try:
+            elapsed, response = timed(single_call, command, *call_args, **call_kwargs)
+        except RuntimeError:
+            metrics.FAILURES.inc("cli", name)
+            raise
+        record_timing("cli", name, elapsed)
+        return response
+
+    CLI.single_call = timed_single_call
+
+
+def record_newman_timings(report_path) -> None:
+    """
+    Record the response time of every item of a newman json report.
+    """
+    try:
+        with open(report_path, 'r') as f:
+            executions = json.load(f)["run"]["executions"]
+    except (OSError, json.JSONDecodeError, KeyError) as err:
+        print(f"[!] Could not read newman report {report_path}: {err}")
+        return
+    for execution in executions:
+        response_time = execution.get("response", {}).get("responseTime")
+        if response_time is not None:
+            record_timing("newman", execution["item"]["name"], response_time / 1000)
+
+
+def wait_for_finality(command, response) -> None:
+    """
+    Wait up to --txn_delay seconds, recording the inclusion time of the staking transaction
+    sent by command if its hash is in the CLI response and its receipt shows up in time.
+    """
+    print(f"Sleeping {args.txn_delay} seconds for finality...\n")
+    start = time.perf_counter()
+    tx_hash = re.search(r"0x[0-9a-fA-F]{64}", response or "")
+    if tx_hash:
+        try:
+            elapsed, _ = wait_for(lambda: TOPOLOGY.call(0, "hmy_getTransactionReceipt", [tx_hash.group()]),
+                                  timeout=args.txn_delay, interval=1)
+            record_timing("finality", command_name(command), elapsed)
+        except (TimeoutError, requests.RequestException, RuntimeError) as err:
+            print(f"\tNo receipt for {tx_hash.group()}: {err}")
+    time.sleep(max(0.0, args.txn_delay - (time.perf_counter() - start)))
+
+
+def add_key(account_name) -> str:
+    """
+    Add a new key to the CLI's keystore (journaled first), returns its address.
+    """
+    JOURNAL.record(account_name)
+    proc = CLI.expect_call(f"hmy keys add {account_name} --passphrase")
+    proc.expect("Enter passphrase\r\n")
+    proc.sendline(f"{args.passphrase}")
+    proc.expect("Repeat the passphrase:\r\n")
+    proc.sendline(f"{args.passphrase}")
+    proc.wait()
+    ACC_NAMES_ADDED.append(account_name)
+    return CLI.get_address(account_name)
+
+
 def is_after_epoch(n):
     url = args.hmy_endpoint_src
     payload = """{
@@ -154,14 +289,7 @@ def create_validator() -> list:
         time.sleep(5)
 
     for key in bls_keys_for_new_val:
-        account_name = f"{ACC_NAME_PREFIX}{random.randint(-1e6, 1e6)}"
-        proc = CLI.expect_call(f"hmy keys add {account_name} --passphrase")
-        proc.expect("Enter passphrase\r\n")
-        proc.sendline(f"{args.passphrase}")
-        proc.expect("Repeat the passphrase:\r\n")
-        proc.sendline(f"{args.passphrase}")
-        proc.wait()
-        address = CLI.get_address(account_name)
+        address = add_key(f"{ACC_NAME_PREFIX}{random.randint(-1e6, 1e6)}")
         added_validators.append(address)
         staking_command = f"hmy staking create-validator --amount 1 " \
                           f"--validator-addr {address} " \
@@ -169,7 +297,6 @@ def create_validator() -> list:
                           f"--max-change-rate 0.1 --max-rate 0.2 --max-total-delegation 10 " \
                           f"--min-self-delegation 1 --rate 0.1 --security-contact Leo  " \
                           f"--website harmony.one --passphrase={args.passphrase}"
-        ACC_NAMES_ADDED.append(account_name)
         print(f"Staking command response for {address}: ", CLI.single_call(staking_command))
 
     for address, key in foundational_node_data:
@@ -201,7 +328,7 @@ def create_validator_many_keys():
     bls_keys = [d for d in bls_generator(10)]
 
     for acc in ACC_NAMES_ADDED:
-        balance = get_balance(acc, args.hmy_endpoint_src)
+        balance = get_balance(acc)
         if balance[0]["amount"] < 1:
             continue
         address = CLI.get_address(acc)
@@ -220,8 +347,7 @@ def create_validator_many_keys():
             print(f"\tStaking transaction response: {response}")
             if i == key_counts[-1]:
                 return
-            print(f"Sleeping {args.txn_delay} seconds for finality...\n")
-            time.sleep(args.txn_delay)
+            wait_for_finality(staking_command, response)
 
     print("Failed CLI staking test.")
     sys.exit(-1)
@@ -241,20 +367,11 @@ def edit_validator(address):
     response = CLI.single_call(staking_command)
     print(f"\tStaking transaction response: {response}")
 
-    print(f"Sleeping {args.txn_delay} seconds for finality...\n")
-    time.sleep(args.txn_delay)
+    wait_for_finality(staking_command, response)
 
 def create_delegator(address) -> str:
     print("== Creating Delegator ==")
-    account_name = f"{ACC_NAME_PREFIX}delegator"
-    proc = CLI.expect_call(f"hmy keys add {account_name} --passphrase")
-    proc.expect("Enter passphrase\r\n")
-    proc.sendline(f"{args.passphrase}")
-    proc.expect("Repeat the passphrase:\r\n")
-    proc.sendline(f"{args.passphrase}")
-    proc.wait()
-    ACC_NAMES_ADDED.append(account_name)
-    delegator_address = CLI.get_address(account_name)
+    delegator_address = add_key(f"{ACC_NAME_PREFIX}delegator")
     staking_command = f"hmy staking delegate --validator-addr {address} " \
                   f"--delegator-addr {delegator_address} --amount 1 " \
                   f"--node={args.hmy_endpoint_src} " \
@@ -262,8 +379,7 @@ def create_delegator(address) -> str:
     response = CLI.single_call(staking_command)
     print(f"\tDelegator transaction response: {response}")
 
-    print(f"Sleeping {args.txn_delay} seconds for finality...\n")
-    time.sleep(args.txn_delay)
+    wait_for_finality(staking_command, response)
 
     return delegator_address
 
@@ -276,8 +392,7 @@ def undelegate(v_address, d_address):
     response = CLI.single_call(staking_command)
     print(f"\tUndelegate transaction response: {response}")
 
-    print(f"Sleeping {args.txn_delay} seconds for finality...\n")
-    time.sleep(args.txn_delay)
+    wait_for_finality(staking_command, response)
 
 def collect_rewards(address):
     print("== Collecting Rewards ==")
@@ -287,8 +402,7 @@ def collect_rewards(address):
     response = CLI.single_call(staking_command)
     print(f"\tCollect rewards transaction response: {response}")
 
-    print(f"Sleeping {args.txn_delay} seconds for finality...\n")
-    time.sleep(args.txn_delay)
+    wait_for_finality(staking_command, response)
 
 def get_validators():
     print("== Listing All Active Validators ==")
@@ -323,63 +437,276 @@ def get_delegator_info(v_addr, d_addr):
     response = CLI.single_call(staking_command)
     print(f"\tDelegator info transaction response: {response}")
 
+def get_bench_validator() -> str:
+    if args.bench_validator:
+        return args.bench_validator
+    create_validator()
+    print(f"Sleeping {args.txn_delay} seconds for finality...\n")
+    time.sleep(args.txn_delay)
+    validators = TOPOLOGY.call(0, "hmy_getAllValidatorAddresses")
+    if not validators:
+        raise RuntimeError("No validator found on chain to benchmark against")
+    return validators[0]
+
+
+def fund_accounts(funders, addresses, amount) -> dict:
+    """
+    Send amount to each address on the beacon shard. Each funder sends serially (nonce ordering),
+    funders send in parallel to each other.
+    Returns address -> (elapsed seconds, CLI output), the output is None if the transfer failed.
+    """
+    node = TOPOLOGY.endpoint(0)
+    results = {}
+
+    def fund(funder, to_addresses):
+        for to_addr in to_addresses:
+            results[to_addr] = timed_cli_call(
+                f"hmy --node={node} transfer --from={funder} --to={to_addr} "
+                f"--from-shard=0 --to-shard=0 --amount={amount} --chain-id={args.chain_id} "
+                f"--passphrase={args.passphrase} --wait-for-confirm={args.txn_delay}")
+            if results[to_addr][1] is None:
+                metrics.FAILURES.inc("cli", "fund")
+
+    with ThreadPoolExecutor(max_workers=len(funders)) as executor:
+        list(executor.map(fund, funders, [addresses[i::len(funders)] for i in range(len(funders))]))
+    return results
+
+
+def timed_cli_call(command) -> tuple:
+    """
+    Returns (elapsed seconds, CLI output), the output is None if the CLI call failed.
+    """
+    start = time.perf_counter()
+    try:
+        response = CLI.single_call(command)
+        return time.perf_counter() - start, response
+    except RuntimeError as err:
+        print(f"[!] '{command_name(command)}' failed: {err}")
+        return time.perf_counter() - start, None
+
+
+def benchmark_row(delegators, call, results) -> dict:
+    succeeded = [(t, r) for t, r in results if r is not None]
+    return {"delegators": delegators, "call": call, **summarize([t for t, _ in succeeded]),
+            "errors": len(results) - len(succeeded),
+            "payload_bytes": max((len(r.encode()) for _, r in succeeded), default=0)}
+
+
+def delegation_fanout_benchmark(counts) -> list:
+    """
+    Grow the delegator set of one validator to each of the counts and measure the latency & payload
+    size of the delegation queries and staking calls at every size.
+    Staking call latencies are the CLI submission time, not the inclusion time. Failed calls (funding
+    transfers included, their accounts are then left out) are counted in the 'errors' column and left
+    out of the latency summary.
+    """
+    print("== Delegation fan-out benchmark ==")
+    node = TOPOLOGY.endpoint(0)
+    gas_buffer = 1
+    funders = [CLI.get_address(n) for n in ACC_NAMES_ADDED if get_balance(n)[0]["amount"] >= args.bench_amount]
+    if not funders:
+        raise RuntimeError("None of the loaded accounts have funds on shard 0")
+    validator = get_bench_validator()
+    print(f"Benchmarking delegations to {validator} with {len(funders)} funder(s)")
+
+    def delegate(address):
+        return timed_cli_call(f"hmy staking delegate --validator-addr {validator} "
+                              f"--delegator-addr {address} --amount {args.bench_amount} "
+                              f"--node={node} --chain-id={args.chain_id} "
+                              f"--passphrase={args.passphrase}")
+
+    delegators, rows = [], []
+    with ThreadPoolExecutor(max_workers=args.bench_workers) as executor:
+        for count in sorted(counts):
+            names = [f"{ACC_NAME_PREFIX}bench_delegator_{random.randint(0, 1e9)}_{i}"
+                     for i in range(count - len(delegators))]
+            new_accounts = list(executor.map(add_key, names))
+            funding = fund_accounts(funders, new_accounts, args.bench_amount + gas_buffer)
+            rows.append(benchmark_row(count, "fund", list(funding.values())))
+            new_delegators = [a for a in new_accounts if funding[a][1] is not None]
+
+            results = list(executor.map(delegate, new_delegators))
+            delegators.extend(d for d, (_, response) in zip(new_delegators, results) if response is not None)
+            rows.append(benchmark_row(count, "delegate", results))
+            print(f"Sleeping {args.txn_delay} seconds for finality...\n")
+            time.sleep(args.txn_delay)
+
+            sample = random.sample(delegators, min(args.bench_samples, len(delegators)))
+            by_validator = f"hmy blockchain delegation by-validator {validator} --node={node}"
+            measured = {
+                "by-validator": [by_validator] * args.bench_samples,
+                "by-delegator": [f"hmy blockchain delegation by-delegator {d} --node={node}" for d in sample],
+                "undelegate": [f"hmy staking undelegate --validator-addr {validator} --delegator-addr {d} "
+                               f"--amount 1 --node={node} --chain-id={args.chain_id} "
+                               f"--passphrase={args.passphrase}" for d in sample],
+                "collect-rewards": [f"hmy staking collect-rewards --delegator-addr {d} --node={node} "
+                                    f"--chain-id={args.chain_id} --passphrase={args.passphrase}" for d in sample],
+            }
+            for call, commands in measured.items():
+                rows.append(benchmark_row(count, call, [timed_cli_call(command) for command in commands]))
+            for row in rows[-len(measured) - 2:]:
+                print(f"\t{row}")
+            csv_path, json_path = write_results(rows, args.bench_output)
+            print(f"Results for {count} delegator(s) written to {csv_path} and {json_path}")
+    return rows
+
+
+def send_staking_dry_run(command) -> dict:
+    """
+    Sign the staking command with the CLI (dry-run), send it over RPC and wait for its receipt.
+    Returns the signed transaction size, gas used and inclusion latency.
+    """
+    response = CLI.single_call(f"{command} --dry-run")
+    raw_candidates = re.findall(r"0x[0-9a-fA-F]{200,}", response)
+    if not raw_candidates:
+        raise RuntimeError(f"Could not find signed transaction in CLI dry-run output: {response}")
+    raw_txn = max(raw_candidates, key=len)
+    start = time.perf_counter()
+    tx_hash = TOPOLOGY.call(0, "hmy_sendRawStakingTransaction", [raw_txn])
+    _, receipt = wait_for(lambda: TOPOLOGY.call(0, "hmy_getTransactionReceipt", [tx_hash]),
+                          timeout=max(args.txn_delay, 1) * 4)
+    inclusion_time = time.perf_counter() - start
+    record_timing("finality", command_name(command), inclusion_time)
+    return {
+        "tx_bytes": (len(raw_txn) - 2) // 2,
+        "gas_used": int(receipt["gasUsed"], 16),
+        "inclusion_s": round(inclusion_time, 3),
+        "status": int(receipt.get("status", "0x1"), 16),
+    }
+
+
+def bls_key_sweep(max_keys) -> list:
+    """
+    Create a validator with 1, 2, 4, ... max_keys BLS keys and add/remove one key on each of them,
+    recording the signed transaction size, gas used and inclusion latency of every staking txn.
+    """
+    print("== BLS key-count sweep ==")
+    node = TOPOLOGY.endpoint(0)
+    counts = sorted({min(2 ** i, max_keys) for i in range(max_keys.bit_length() + 1)})
+    funders = [CLI.get_address(n) for n in ACC_NAMES_ADDED if get_balance(n)[0]["amount"] >= args.bench_amount]
+    if not funders:
+        raise RuntimeError("None of the loaded accounts have funds on shard 0")
+    # A BLS key can only be used by one validator, so each one gets its own keys (and spare key).
+    print(f"Generating {sum(counts) + len(counts)} BLS keys...")
+    bls_keys = [d["public-key"] for d in bls_generator(sum(counts) + len(counts))]
+    spare_keys = bls_keys[sum(counts):]
+    key_sets = [bls_keys[sum(counts[:i]):sum(counts[:i + 1])] for i in range(len(counts))]
+
+    names = [f"{ACC_NAME_PREFIX}bench_validator_{random.randint(0, 1e9)}_{n}" for n in counts]
+    with ThreadPoolExecutor(max_workers=args.bench_workers) as executor:
+        validators = list(executor.map(add_key, names))
+    funding = fund_accounts(funders, validators, args.bench_amount + 1)
+
+    rows = []
+    for count, address, keys, spare_key in zip(counts, validators, key_sets, spare_keys):
+        if funding[address][1] is None:
+            rows.append({"keys": count, "call": "fund", "error": "funding transfer failed"})
+            print(f"\t{rows[-1]}")
+            continue
+        common = f"--node={node} --chain-id={args.chain_id} --passphrase={args.passphrase}"
+        steps = [
+            ("create-validator",
+             f"hmy staking create-validator --amount {args.bench_amount} --validator-addr {address} "
+             f"--bls-pubkeys {','.join(keys)} --identity foo --details bar --name baz "
+             f"--max-change-rate 0.1 --max-rate 0.2 --max-total-delegation {args.bench_amount * 10} "
+             f"--min-self-delegation 1 --rate 0.1 --security-contact Leo --website harmony.one {common}"),
+            ("edit-validator add-bls-key",
+             f"hmy staking edit-validator --validator-addr {address} --add-bls-key {spare_key} {common}"),
+            ("edit-validator remove-bls-key",
+             f"hmy staking edit-validator --validator-addr {address} --remove-bls-key {spare_key} {common}"),
+        ]
+        for call, command in steps:
+            try:
+                result = send_staking_dry_run(command)
+            except (RuntimeError, TimeoutError) as err:
+                print(f"[!] {call} with {count} key(s) failed: {err}")
+                metrics.FAILURES.inc("staking", call)
+                result = {"error": str(err)}
+            rows.append({"keys": count, "call": call, **result})
+            print(f"\t{rows[-1]}")
+        write_results(rows, args.bench_output)
+    print(f"Results written to {args.bench_output}.csv and {args.bench_output}.json")
+    return rows
+
+
+def has_pending_txn(address, shard) -> bool:
+    try:
+        latest = TOPOLOGY.call(shard, "hmy_getTransactionCount", [address, "latest"])
+        pending = TOPOLOGY.call(shard, "hmy_getTransactionCount", [address, "pending"])
+    except (requests.RequestException, RuntimeError):
+        return False  # Let the CLI decide.
+    return int(pending, 16) > int(latest, 16)
+
+
 def get_raw_txn(passphrase, chain_id, node, src_shard, dst_shard) -> str:
     """
     Must be cross shard transaction for tests.
 
+    Senders rotate over the loaded accounts between calls and accounts with a pending transaction
+    are skipped, so back to back calls (e.g. canary cycles) never sign with a nonce already in the pool.
+
     If importing keys using 'import-ks', no passphrase is needed.
     """
+    global NEXT_SENDER
     print("== Getting raw transaction ==")
     assert len(ACC_NAMES_ADDED) > 1, "Must load at least 2 keys and must match CLI's keystore format"
-    for acc_name in ACC_NAMES_ADDED:
-        balances = get_balance(acc_name, node)
+    for offset in range(len(ACC_NAMES_ADDED)):
+        sender_index = (NEXT_SENDER + offset) % len(ACC_NAMES_ADDED)
+        acc_name = ACC_NAMES_ADDED[sender_index]
+        balances = get_balance(acc_name)
         from_addr = CLI.get_address(acc_name)
         to_addr_candidates = ACC_NAMES_ADDED.copy()
         to_addr_candidates.remove(acc_name)
         to_addr = CLI.get_address(random.choice(to_addr_candidates))
-        if balances[src_shard]["amount"] >= 5:  # Ensure enough funds (even with high gas fees).
-            print(f"Raw transaction details:\n"
-                  f"\tNode: {node}\n"
-                  f"\tFrom: {from_addr}\n"
-                  f"\tTo: {to_addr}\n"
-                  f"\tFrom-shard: {src_shard}\n"
-                  f"\tTo-shard: {dst_shard}")
-            response = CLI.single_call(f"hmy --node={node} transfer --from={from_addr} --to={to_addr} "
-                                       f"--from-shard={src_shard} --to-shard={dst_shard} --amount={1e-9} "
-                                       f"--chain-id={chain_id} --dry-run --passphrase={passphrase}")
-            print(f"\tTransaction for {chain_id}")
-            response_lines = response.split("\n")
-            assert len(response_lines) == 17, 'CLI output for transaction dry-run is not recognized, check CLI version.'
-            transaction = '\n\t\t'.join(response_lines[1:15])
-            print(f"\tTransaction:\n\t\t{transaction}")
-            return response_lines[-2].replace("RawTxn: ", "")
-    raise RuntimeError(f"None of the loaded accounts have funds on shard {src_shard}")
+        if balances[src_shard]["amount"] < 5:  # Ensure enough funds (even with high gas fees).
+            continue
+        if has_pending_txn(from_addr, src_shard):
+            print(f"\tSkipping {from_addr}, it has a pending transaction on shard {src_shard}")
+            continue
+        NEXT_SENDER = sender_index + 1
+        print(f"Raw transaction details:\n"
+              f"\tNode: {node}\n"
+              f"\tFrom: {from_addr}\n"
+              f"\tTo: {to_addr}\n"
+              f"\tFrom-shard: {src_shard}\n"
+              f"\tTo-shard: {dst_shard}")
+        response = CLI.single_call(f"hmy --node={node} transfer --from={from_addr} --to={to_addr} "
+                                   f"--from-shard={src_shard} --to-shard={dst_shard} --amount={1e-9} "
+                                   f"--chain-id={chain_id} --dry-run --passphrase={passphrase}")
+        print(f"\tTransaction for {chain_id}")
+        response_lines = response.split("\n")
+        assert len(response_lines) == 17, 'CLI output for transaction dry-run is not recognized, check CLI version.'
+        transaction = '\n\t\t'.join(response_lines[1:15])
+        print(f"\tTransaction:\n\t\t{transaction}")
+        return response_lines[-2].replace("RawTxn: ", "")
+    raise RuntimeError(f"None of the loaded accounts have funds (and no pending transaction) on shard {src_shard}")
 
 
 def get_shard_from_endpoint(endpoint):
     """
-    Currently assumes <= 10 shards
+    Shard served by the endpoint, according to the network's sharding structure.
+    """
+    return TOPOLOGY.shard_of(endpoint)
+
+
+def get_cx_shards():
     """
-    re_match = re.search('\.s.\.', endpoint)
-    if re_match:
-        return int(re_match.group(0)[-2])
-    re_match = re.search(':950./', endpoint)
-    if re_match:
-        return int(re_match.group(0)[-2])
-    raise ValueError(f"Unknown endpoint format: {endpoint}")
+    Returns the (source, destination) shard of the Cx, inferred from the endpoints if not provided.
+    """
+    source_shard = int(args.src_shard) if args.src_shard else get_shard_from_endpoint(args.hmy_endpoint_src)
+    destination_shard = int(args.dst_shard) if args.dst_shard else get_shard_from_endpoint(args.hmy_endpoint_dst)
+    if get_shard_from_endpoint(args.hmy_endpoint_src) != source_shard:
+        print(f"Source shard {source_shard} does not match source endpoint {args.hmy_endpoint_src}")
+    if get_shard_from_endpoint(args.hmy_endpoint_dst) != destination_shard:
+        print(f"Destination shard {destination_shard} does not match destination endpoint {args.hmy_endpoint_dst}")
+    return source_shard, destination_shard
 
 
 def setup_newman_no_explorer(test_json, global_json, env_json):
-    source_shard = args.src_shard if args.src_shard else get_shard_from_endpoint(args.hmy_endpoint_src)
-    destination_shard = args.dst_shard if args.dst_shard else get_shard_from_endpoint(args.hmy_endpoint_dst)
+    source_shard, destination_shard = get_cx_shards()
     raw_txn = get_raw_txn(passphrase=args.passphrase, chain_id=args.chain_id,
                           node=args.hmy_endpoint_src, src_shard=source_shard, dst_shard=destination_shard)
 
-    if str(source_shard) not in args.hmy_endpoint_src:
-        print(f"Source shard {source_shard} may not match source endpoint {args.hmy_endpoint_src}")
-    if str(destination_shard) not in args.hmy_endpoint_dst:
-        print(f"Destination shard {destination_shard} may not match destination endpoint {args.hmy_endpoint_dst}")
-
     for i, var in enumerate(env_json["values"]):
         if var["key"] == "rawTransaction":
             env_json["values"][i]["value"] = raw_txn
@@ -397,16 +724,10 @@ def setup_newman_only_explorer(test_json, global_json, env_json):
     if "localhost" in args.hmy_endpoint_src or "localhost" in args.hmy_exp_endpoint:
         print("\n\t[WARNING] This test is for testnet or mainnet.\n")
 
-    source_shard = args.src_shard if args.src_shard else get_shard_from_endpoint(args.hmy_endpoint_src)
-    destination_shard = args.dst_shard if args.dst_shard else get_shard_from_endpoint(args.hmy_endpoint_dst)
+    source_shard, destination_shard = get_cx_shards()
     raw_txn = get_raw_txn(passphrase=args.passphrase, chain_id=args.chain_id,
                           node=args.hmy_endpoint_src, src_shard=source_shard, dst_shard=destination_shard)
 
-    if str(source_shard) not in args.hmy_endpoint_src:
-        print(f"Source shard {source_shard} may not match source endpoint {args.hmy_endpoint_src}")
-    if str(destination_shard) not in args.hmy_endpoint_dst:
-        print(f"Destination shard {destination_shard} may not match destination endpoint {args.hmy_endpoint_dst}")
-
     for i, var in enumerate(env_json["values"]):
         if var["key"] == "rawTransaction":
             env_json["values"][i]["value"] = raw_txn
@@ -428,16 +749,10 @@ def setup_newman_default(test_json, global_json, env_json):
     if "localhost" in args.hmy_endpoint_src or "localhost" in args.hmy_exp_endpoint:
         print("\n\t[WARNING] This test is for testnet or mainnet.\n")
 
-    source_shard = args.src_shard if args.src_shard else get_shard_from_endpoint(args.hmy_endpoint_src)
-    destination_shard = args.dst_shard if args.dst_shard else get_shard_from_endpoint(args.hmy_endpoint_dst)
+    source_shard, destination_shard = get_cx_shards()
     raw_txn = get_raw_txn(passphrase=args.passphrase, chain_id=args.chain_id,
                           node=args.hmy_endpoint_src, src_shard=source_shard, dst_shard=destination_shard)
 
-    if str(source_shard) not in args.hmy_endpoint_src:
-        print(f"Source shard {source_shard} may not match source endpoint {args.hmy_endpoint_src}")
-    if str(destination_shard) not in args.hmy_endpoint_dst:
-        print(f"Destination shard {destination_shard} may not match destination endpoint {args.hmy_endpoint_dst}")
-
     for i, var in enumerate(env_json["values"]):
         if var["key"] == "rawTransaction":
             env_json["values"][i]["value"] = raw_txn
@@ -457,6 +772,120 @@ def setup_newman_default(test_json, global_json, env_json):
             global_json["values"][i]["value"] = args.hmy_exp_endpoint
 
 
+def prepare_newman() -> None:
+    """
+    Fill in the collection's globals & env (with a freshly signed raw transaction).
+    """
+    with open(f"{args.test_dir}/test.json", 'r') as f:
+        test_json = json.load(f)
+    with open(f"{args.test_dir}/global.json", 'r') as f:
+        global_json = json.load(f)
+    with open(f"{args.test_dir}/env.json", 'r') as f:
+        env_json = json.load(f)
+
+    if "Harmony API Tests - no-explorer" in test_json["info"]["name"]:
+        setup_newman_no_explorer(test_json, global_json, env_json)
+    elif "Harmony API Tests - only-explorer" in test_json["info"]["name"]:
+        setup_newman_only_explorer(test_json, global_json, env_json)
+    else:
+        setup_newman_default(test_json, global_json, env_json)
+
+    with open(f"{args.test_dir}/global.json", 'w') as f:
+        json.dump(global_json, f)
+    with open(f"{args.test_dir}/env.json", 'w') as f:
+        json.dump(env_json, f)
+
+
+def run_newman(iterations) -> int:
+    """
+    Run the collection until it succeeds (at most `iterations` times), returns newman's exit code.
+    """
+    exit_code = 0
+    for i in range(iterations):
+        print(f"\n\tIteration {i+1} out of {iterations}\n")
+        proc = subprocess.Popen(["newman", "run", f"{args.test_dir}/test.json",
+                                 "-e", f"{args.test_dir}/env.json",
+                                 "-g", f"{args.test_dir}/global.json",
+                                 "--reporters", "cli,json",
+                                 "--reporter-json-export", f"{args.test_dir}/newman_report.json"])
+        proc.wait()
+        record_newman_timings(f"{args.test_dir}/newman_report.json")
+        exit_code = proc.returncode
+        if proc.returncode == 0:
+            print(f"\n\tSucceeded in {i+1} attempt(s)\n")
+            break
+        metrics.RETRIES.inc("newman")
+    return exit_code
+
+
+def cx_transfer_check() -> None:
+    """
+    Send a small (cross-shard) transfer between the loaded accounts and wait for it to land on both shards.
+    """
+    source_shard, destination_shard = get_cx_shards()
+    raw_txn = get_raw_txn(passphrase=args.passphrase, chain_id=args.chain_id,
+                          node=args.hmy_endpoint_src, src_shard=source_shard, dst_shard=destination_shard)
+    timeout = max(args.txn_delay, 1) * 4
+    start = time.perf_counter()
+    tx_hash = TOPOLOGY.call(source_shard, "hmy_sendRawTransaction", [raw_txn])
+    wait_for(lambda: TOPOLOGY.get_transaction_receipt(tx_hash, source_shard), timeout=timeout, interval=1)
+    record_timing("finality", "canary transfer", time.perf_counter() - start)
+    if source_shard != destination_shard:
+        wait_for(lambda: TOPOLOGY.get_cx_receipt(tx_hash, destination_shard), timeout=timeout, interval=1)
+        record_timing("finality", "canary cx", time.perf_counter() - start)
+
+
+def canary_check(name, fn) -> bool:
+    start, ok = time.perf_counter(), False
+    try:
+        ok = fn() in (None, 0)
+    except (RuntimeError, TimeoutError, AssertionError, OSError, KeyError, ValueError,
+            requests.RequestException) as err:
+        print(f"[!] Canary check '{name}' failed: {err}")
+    record_timing("check", name, time.perf_counter() - start, ok)
+    metrics.CHECKS.inc(name, "ok" if ok else "failed")
+    return ok
+
+
+def canary(interval, duration_hours) -> int:
+    """
+    Run the regression collection and a cross-shard transfer every `interval` seconds, reusing the loaded
+    keys, CLI and connections. Rolling stats are printed & saved after each cycle, timings are flushed
+    to the results store so memory stays flat over long runs.
+    Returns 1 if the last cycle failed, 0 otherwise.
+    """
+    print(f"== Canary: every {interval}s for {duration_hours or 'unlimited'} hour(s) ==")
+    deadline = time.time() + duration_hours * 3600 if duration_hours else float("inf")
+    next_cycle, cycle, failed = time.time(), 0, False
+    try:
+        while time.time() < deadline:
+            cycle += 1
+            checks = []
+            if not args.ignore_regression_test:
+                checks.append(canary_check("regression", lambda: prepare_newman() or run_newman(1)))
+            checks.append(canary_check("cx transfer", cx_transfer_check))
+            failed = not all(checks)
+            if STORE:
+                STORE.flush()
+            stats = ROLLING.summary()
+            with open(f"{args.canary_output}.tmp", 'w') as f:
+                json.dump({"cycle": cycle, "time": time.time(), "rss_bytes": rss_bytes(), "stats": stats}, f, indent=2)
+            os.replace(f"{args.canary_output}.tmp", args.canary_output)
+            print(f"\n\tCanary cycle {cycle}: {'FAILED' if failed else 'OK'} (rss {rss_bytes() // 2 ** 20} MiB)")
+            for name, row in ROLLING.summary("check ").items():
+                print(f"\t{name[len('check '):]}: availability {row['availability']:.2%}, p50 {row.get('p50_ms')} ms, "
+                      f"p95 {row.get('p95_ms')} ms ({row['failed']}/{row['total']} failed overall)")
+            next_cycle += interval
+            if next_cycle < time.time():
+                skipped = int((time.time() - next_cycle) // interval) + 1
+                print(f"[!] Cycle took longer than the {interval}s interval, skipping {skipped} slot(s)")
+                next_cycle += skipped * interval
+            time.sleep(max(0.0, min(next_cycle, deadline) - time.time()))
+    except KeyboardInterrupt:
+        print(f"\n\tCanary stopped after {cycle} cycle(s)")
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
     args = parse_args()
     print("\n\t== Starting Tests ==\n")
@@ -465,8 +894,28 @@ if __name__ == "__main__":
     assert os.path.isdir(args.keys_dir), "Could not find keystore directory"
 
     CLI = pyhmy.HmyCLI(environment=pyhmy.get_environment(), hmy_binary_path=args.hmy_binary_path)
+    TOPOLOGY = Topology([args.hmy_endpoint_src, args.hmy_endpoint_dst])
+    JOURNAL = KeystoreJournal(CLI.keystore_path)
+    reclaimed = JOURNAL.recover()
+    if reclaimed:
+        print(f"Removed {len(reclaimed)} leftover test key(s) from previous runs: {reclaimed}")
+    JOURNAL.install()
+    STORE = ResultsStore(args.results_db) if args.results_db else None
+    ROLLING = RollingStats(args.canary_window) if args.canary_interval else None
+    modes = [mode for mode, enabled in (("bench", args.delegation_bench), ("bls-sweep", args.bls_sweep),
+                                        ("canary", args.canary_interval)) if enabled]
+    bench_mode = bool(modes)
+    driver = f"test.py:{'+'.join(modes)}" if modes else "test.py"  # Regressions only compare runs of one mode.
+    if STORE:
+        STORE.start_run(driver, CLI.version, args.chain_id, args.hmy_endpoint_src)
+    if args.metrics_port:
+        metrics.start_server(args.metrics_port, args.metrics_host)
+        print(f"Serving metrics on {args.metrics_host}:{args.metrics_port}/metrics")
+    add_observer(observe_rpc)
+    instrument_cli()
     exit_code = 0
     print(f"CLI Version: {CLI.version}")
+    print(f"Sharding structure: {TOPOLOGY.shards}")
 
     try:
         load_keys()
@@ -475,7 +924,12 @@ if __name__ == "__main__":
         while not is_after_epoch(args.start_epoch-1):
             time.sleep(5)
 
-        if not args.ignore_staking_test:
+        if args.delegation_bench:
+            delegation_fanout_benchmark([int(n) for n in args.delegation_bench.split(",")])
+        if args.bls_sweep:
+            bls_key_sweep(args.bls_sweep)
+
+        if not args.ignore_staking_test and not bench_mode:
             test_validators = create_validator()
             create_validator_many_keys()
             edit_validator(test_validators[0])
@@ -486,44 +940,18 @@ if __name__ == "__main__":
             get_validator_info(test_validators[0])
             get_delegator_info(test_validators[0], delegator)
 
-        if not args.ignore_regression_test:
-            with open(f"{args.test_dir}/test.json", 'r') as f:
-                test_json = json.load(f)
-            with open(f"{args.test_dir}/global.json", 'r') as f:
-                global_json = json.load(f)
-            with open(f"{args.test_dir}/env.json", 'r') as f:
-                env_json = json.load(f)
-
-            if "Harmony API Tests - no-explorer" in test_json["info"]["name"]:
-                setup_newman_no_explorer(test_json, global_json, env_json)
-            elif "Harmony API Tests - only-explorer" in test_json["info"]["name"]:
-                setup_newman_only_explorer(test_json, global_json, env_json)
-            else:
-                setup_newman_default(test_json, global_json, env_json)
-
-            with open(f"{args.test_dir}/global.json", 'w') as f:
-                json.dump(global_json, f)
-            with open(f"{args.test_dir}/env.json", 'w') as f:
-                json.dump(env_json, f)
-
-            for i in range(args.iterations):
-                print(f"\n\tIteration {i+1} out of {args.iterations}\n")
-                proc = subprocess.Popen(["newman", "run", f"{args.test_dir}/test.json",
-                                         "-e", f"{args.test_dir}/env.json",
-                                         "-g", f"{args.test_dir}/global.json"])
-                proc.wait()
-                exit_code = proc.returncode
-                if proc.returncode == 0:
-                    print(f"\n\tSucceeded in {i+1} attempt(s)\n")
-                    break
-
-    except (RuntimeError, KeyboardInterrupt) as err:
+        if not args.ignore_regression_test and not bench_mode:
+            prepare_newman()
+            exit_code = run_newman(args.iterations)
+
+        if args.canary_interval:
+            exit_code = canary(args.canary_interval, args.canary_duration)
+
+    finally:
         print("Removing imported keys from CLI's keystore...")
-        for acc_name in ACC_NAMES_ADDED:
-            CLI.remove_account(acc_name)
-        raise err
+        JOURNAL.cleanup()
+        if STORE:
+            STORE.close()
+            print(f"Timings saved to {args.results_db} (run {STORE.run_id})")
 
-    print("Removing imported keys from CLI's keystore...")
-    for acc_name in ACC_NAMES_ADDED:
-        CLI.remove_account(acc_name)
     sys.exit(exit_code)
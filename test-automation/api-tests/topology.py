@@ -0,0 +1,252 @@
+"""
+Sharding structure discovery and shard-aware request routing.
+
+The sharding structure is queried once from the seed endpoint(s) and cached as a
+shard -> endpoints map. Calls are routed to the right shard automatically and spread
+round-robin over the seeds of that shard (or all its endpoints if no seed serves it),
+a call failing at the HTTP level is retried on the next endpoint of the shard.
+Multi-shard queries are fanned out in parallel.
+
+Example:
+    topology = Topology(["https://api.s0.b.hmny.io/"])
+    topology.shard_of("https://api.s1.b.hmny.io/")  # 1
+    topology.get_balances("one1...")                # [{'shard': 0, 'amount': 1.5}, ...]
+"""
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+_LOCAL = threading.local()
+_OBSERVERS = []
+
+
+def add_observer(fn) -> None:
+    """
+    fn(method, seconds, error) is called after every RPC call made through this module,
+    error is None for successful calls.
+    """
+    _OBSERVERS.append(fn)
+
+
+def _session() -> requests.Session:
+    if not hasattr(_LOCAL, "session"):
+        _LOCAL.session = requests.Session()
+    return _LOCAL.session
+
+
+def normalize_endpoint(endpoint) -> str:
+    """
+    Lowercase scheme and host (paths can be case sensitive, e.g. behind a proxy) with a single trailing slash.
+    """
+    parts = urlsplit(endpoint.strip())
+    path = parts.path.rstrip("/") + "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, parts.fragment))
+
+
+def rpc_call(endpoint, method, params=None, timeout=10):
+    """
+    Single JSON-RPC call. Raises RuntimeError if the node returns an error.
+    """
+    payload = {"jsonrpc": "2.0", "method": method, "params": params or [], "id": 1}
+    start, error = time.perf_counter(), None
+    try:
+        response = _session().post(endpoint, json=payload, allow_redirects=False, timeout=timeout)
+        try:
+            body = json.loads(response.content)
+        except json.JSONDecodeError as err:
+            raise RuntimeError(f"Non JSON response from {endpoint} for {method}: {response.content[:200]}") from err
+        if "error" in body:
+            raise RuntimeError(f"{method} on {endpoint} returned error: {body['error']}")
+        return body.get("result")
+    except Exception as err:  # Observers see every failure, not only the expected ones.
+        error = err
+        raise
+    finally:
+        for observer in _OBSERVERS:
+            observer(method, time.perf_counter() - start, error)
+
+
+def rpc_batch(endpoint, calls, timeout=30) -> list:
+    """
+    Batched JSON-RPC call of (method, params) tuples, in one HTTP request.
+    Returns a (result, error) tuple per call, in order. Raises RuntimeError if the batch itself fails.
+    """
+    payload = [{"jsonrpc": "2.0", "method": method, "params": params or [], "id": i}
+               for i, (method, params) in enumerate(calls)]
+    start, error = time.perf_counter(), None
+    try:
+        response = _session().post(endpoint, json=payload, allow_redirects=False, timeout=timeout)
+        try:
+            body = json.loads(response.content)
+        except json.JSONDecodeError as err:
+            raise RuntimeError(f"Non JSON response from {endpoint} for batch: {response.content[:200]}") from err
+        if not isinstance(body, list):
+            raise RuntimeError(f"Batch of {len(calls)} call(s) on {endpoint} returned: {str(body)[:200]}")
+        by_id = {item.get("id"): item for item in body if isinstance(item, dict)}
+        missing = {"error": {"code": -32603, "message": "missing from batch response"}}
+        return [(by_id.get(i, missing).get("result"), by_id.get(i, missing).get("error")) for i in range(len(calls))]
+    except Exception as err:  # Observers see every failure, not only the expected ones.
+        error = err
+        raise
+    finally:
+        for observer in _OBSERVERS:
+            observer("batch", time.perf_counter() - start, error)
+
+
+class Topology:
+    def __init__(self, seed_endpoints, timeout=10, max_workers=16):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.shards = {}
+        self.endpoint_shard = {}
+        self._cycles = {}
+        self._seeds = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.seeds = [normalize_endpoint(e) for e in seed_endpoints]
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        (Re)query the sharding structure from the seeds, seeds are listed (and preferred) first for their shard.
+        """
+        shards, endpoint_shard, seeds = {}, {}, {}
+        errors = []
+        for seed in self.seeds:
+            try:
+                structure = rpc_call(seed, "hmy_getShardingStructure", timeout=self.timeout)
+            except (requests.RequestException, RuntimeError) as err:
+                errors.append(f"{seed}: {err}")
+                continue
+            for entry in structure:
+                shard_id = int(entry["shardID"])
+                http = normalize_endpoint(entry["http"])
+                shards.setdefault(shard_id, [])
+                if http not in shards[shard_id]:
+                    shards[shard_id].append(http)
+                endpoint_shard[http] = shard_id
+                if entry.get("current"):
+                    endpoint_shard[seed] = shard_id
+                    if seed not in seeds.setdefault(shard_id, []):
+                        seeds[shard_id].append(seed)
+        if not shards:
+            raise RuntimeError("Could not get the sharding structure from any seed:\n\t" + "\n\t".join(errors))
+        for shard_id, shard_seeds in seeds.items():
+            shards[shard_id] = shard_seeds + [e for e in shards[shard_id] if e not in shard_seeds]
+        with self.lock:
+            self.shards = shards
+            self.endpoint_shard = endpoint_shard
+            self._seeds = seeds
+            self._cycles = {s: itertools.cycle(seeds.get(s) or e) for s, e in shards.items()}
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shards)
+
+    def endpoints(self, shard) -> list:
+        if int(shard) not in self.shards:
+            raise ValueError(f"Unknown shard {shard}, network has shards {sorted(self.shards)}")
+        return list(self.shards[int(shard)])
+
+    def endpoint(self, shard) -> str:
+        """
+        Next endpoint of the shard, round-robin over its seeds if any, else over all its endpoints.
+        """
+        self.endpoints(shard)
+        with self.lock:
+            return next(self._cycles[int(shard)])
+
+    def _with_failover(self, shard, fn):
+        """
+        fn(endpoint) on the next endpoint of the shard, retried on the others if the request itself fails.
+        """
+        first = self.endpoint(shard)
+        candidates = [first] + [e for e in self.endpoints(shard) if e != first]
+        for i, endpoint in enumerate(candidates):
+            try:
+                return fn(endpoint)
+            except requests.RequestException:
+                if i == len(candidates) - 1:
+                    raise
+
+    def add_endpoint(self, endpoint, shard=None) -> int:
+        """
+        Add an endpoint to the routing table, its shard is asked from the node if not provided.
+        """
+        endpoint = normalize_endpoint(endpoint)
+        if shard is None:
+            shard = int(rpc_call(endpoint, "hmy_latestHeader", timeout=self.timeout)["shardID"])
+        with self.lock:
+            self.shards.setdefault(int(shard), [])
+            if endpoint not in self.shards[int(shard)]:
+                self.shards[int(shard)].append(endpoint)
+                if not self._seeds.get(int(shard)):
+                    self._cycles[int(shard)] = itertools.cycle(self.shards[int(shard)])
+            self.endpoint_shard[endpoint] = int(shard)
+        return int(shard)
+
+    def shard_of(self, endpoint) -> int:
+        """
+        Shard served by the endpoint, unknown endpoints are looked up (and cached).
+        """
+        shard = self.endpoint_shard.get(normalize_endpoint(endpoint))
+        return shard if shard is not None else self.add_endpoint(endpoint)
+
+    def call(self, shard, method, params=None):
+        return self._with_failover(shard, lambda endpoint: rpc_call(endpoint, method, params, timeout=self.timeout))
+
+    def batch(self, shard, calls, timeout=None) -> list:
+        return self._with_failover(shard, lambda endpoint: rpc_batch(endpoint, calls, timeout=timeout or self.timeout))
+
+    def fan_out(self, method, params=None, shards=None) -> dict:
+        """
+        Call method on every (or the given) shard in parallel, returns a shard -> result dict.
+        Failed calls map to the raised exception instead of a result.
+        """
+        shards = sorted(self.shards) if shards is None else shards
+        futures = {s: self._executor.submit(self.call, s, method, params) for s in shards}
+        results = {}
+        for shard, future in futures.items():
+            try:
+                results[shard] = future.result()
+            except (requests.RequestException, RuntimeError) as err:
+                results[shard] = err
+        return results
+
+    def get_balance(self, address, shard) -> float:
+        return int(self.call(shard, "hmy_getBalance", [address, "latest"]), 16) * 10 ** -18
+
+    def get_balances(self, address) -> list:
+        """
+        Same format as the CLI's 'hmy balances' output, shards whose call failed are left out.
+        """
+        results = self.fan_out("hmy_getBalance", [address, "latest"])
+        return [{"shard": s, "amount": int(r, 16) * 10 ** -18} for s, r in sorted(results.items())
+                if not isinstance(r, Exception)]
+
+    def _find(self, method, params, shard):
+        if shard is not None:
+            return shard, self.call(shard, method, params)
+        for shard, result in self.fan_out(method, params).items():
+            if result is not None and not isinstance(result, Exception):
+                return shard, result
+        return None, None
+
+    def get_transaction_receipt(self, tx_hash, shard=None):
+        """
+        Receipt of tx_hash, all shards are searched in parallel if the shard is not given.
+        """
+        return self._find("hmy_getTransactionReceipt", [tx_hash], shard)[1]
+
+    def get_cx_receipt(self, tx_hash, dst_shard=None):
+        """
+        CX receipt of tx_hash (only available on the destination shard).
+        """
+        return self._find("hmy_getCXReceiptByHash", [tx_hash], dst_shard)[1]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
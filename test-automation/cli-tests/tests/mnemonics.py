@@ -0,0 +1,89 @@
+"""
+Native (no CLI) BIP39 mnemonic -> BIP32/BIP44 key -> 'one1...' address derivation, in batch.
+
+Harmony accounts are derived on the path m/44'/1023'/0'/0/<index>. The m/44'/1023'/0'/0
+node is derived once per task, so each extra index costs a single child derivation.
+Work is spread over a process pool in tasks of one mnemonic and a range of its indices,
+so a few mnemonics with many indices still use every core.
+"""
+import hashlib
+import hmac
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+from hmy_crypto import SECP256K1_N, private_key_to_point, compress_point, point_to_address, to_one_address
+
+HARDENED = 0x80000000
+HARMONY_COIN_TYPE = 1023
+ACCOUNT_PATH = [44 + HARDENED, HARMONY_COIN_TYPE + HARDENED, 0 + HARDENED, 0]
+MIN_INDICES_PER_TASK = 16  # Keeps the per-task mnemonic -> account node derivation (PBKDF2) amortized.
+
+
+def mnemonic_to_seed(mnemonic, passphrase="") -> bytes:
+    mnemonic = unicodedata.normalize("NFKD", " ".join(mnemonic.split()))
+    salt = unicodedata.normalize("NFKD", "mnemonic" + passphrase)
+    return hashlib.pbkdf2_hmac("sha512", mnemonic.encode(), salt.encode(), 2048)
+
+
+def _child_key(private_key, chain_code, index, parent_point=None):
+    if index & HARDENED:
+        data = b'\x00' + private_key.to_bytes(32, 'big')
+    else:
+        data = compress_point(parent_point or private_key_to_point(private_key))
+    digest = hmac.new(chain_code, data + index.to_bytes(4, 'big'), hashlib.sha512).digest()
+    left = int.from_bytes(digest[:32], 'big')
+    child = (left + private_key) % SECP256K1_N
+    if left >= SECP256K1_N or child == 0:
+        raise ValueError(f"Invalid child key at index {index}, use the next index")
+    return child, digest[32:]
+
+
+def derive_private_keys(mnemonic, indices, passphrase="") -> dict:
+    """
+    Returns a dict of index -> private key (int) for m/44'/1023'/0'/0/<index>.
+    """
+    digest = hmac.new(b"Bitcoin seed", mnemonic_to_seed(mnemonic, passphrase), hashlib.sha512).digest()
+    private_key, chain_code = int.from_bytes(digest[:32], 'big'), digest[32:]
+    for index in ACCOUNT_PATH:
+        private_key, chain_code = _child_key(private_key, chain_code, index)
+    parent_point = private_key_to_point(private_key)
+    return {i: _child_key(private_key, chain_code, i, parent_point)[0] for i in indices}
+
+
+def derive_addresses(mnemonic, indices, passphrase="") -> dict:
+    """
+    Returns a dict of index -> (private key hex, compressed public key hex, 'one1...' address).
+    """
+    derived = {}
+    for index, private_key in derive_private_keys(mnemonic, indices, passphrase).items():
+        point = private_key_to_point(private_key)
+        derived[index] = (f"0x{private_key:064x}", "0x" + compress_point(point).hex(),
+                          to_one_address(point_to_address(point)))
+    return derived
+
+
+def _derive_task(task):
+    mnemonic, indices = task
+    return mnemonic, derive_addresses(mnemonic, indices)
+
+
+def derive_batch(vectors, processes=None) -> list:
+    """
+    Derive every vector ({'phrase': ..., 'index': ...} dicts) in a process pool.
+    Returns a list of (vector, derived private key hex, derived public key hex, derived address), in input order.
+    """
+    groups = {}
+    for vector in vectors:
+        groups.setdefault(vector["phrase"], set()).add(int(vector["index"]))
+    total = sum(len(indices) for indices in groups.values())
+    per_task = max(MIN_INDICES_PER_TASK, -(-total // (4 * (processes or os.cpu_count() or 1))))
+    tasks = []
+    for mnemonic, indices in groups.items():
+        indices = sorted(indices)
+        tasks.extend((mnemonic, indices[i:i + per_task]) for i in range(0, len(indices), per_task))
+    derived = {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for mnemonic, keys in executor.map(_derive_task, tasks):
+            derived.setdefault(mnemonic, {}).update(keys)
+    return [(v, *derived[v["phrase"]][int(v["index"])]) for v in vectors]
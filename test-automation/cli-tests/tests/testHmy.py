@@ -1,13 +1,20 @@
 #!/usr/bin/env python
-from utils import *
+import os
+import sys
+
+# The shared helpers (metrics, keystore journal, crypto, results store) live with the API tests.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "api-tests"))
+
+import metrics
+from keystore_journal import KeystoreJournal
+from hmy_crypto import to_one_address
+from results_store import ResultsStore
+from mnemonics import derive_batch
+from utils import get_logger, test_announce, hmy_check_output, rpc_post, TEST_DURATIONS
 import subprocess
 import pexpect
-import os
-import shutil
 import json
-import sys
 import random
-import requests
 import time
 
 log = get_logger(filename="testHmy.log")
@@ -15,6 +22,12 @@ ENVIRONMENT = {}
 ADDRESSES = {}
 KEYSTORE_PATH = ""
 KEYS_ADDED = set()
+JOURNAL = None
+MNEMONIC_CLI_SAMPLE_SIZE = 2  # Reference mnemonics also cross-checked with the CLI, one with a non-zero index.
+RESULTS_DB = "./perf_results.db"
+NODE_URL = "http://localhost:9500/"  # Default node of the hmy CLI, which the tests call without --node.
+METRICS_PORT = os.environ.get("HMY_TEST_METRICS_PORT")  # Serves Prometheus /metrics while the tests run if set.
+METRICS_HOST = os.environ.get("HMY_TEST_METRICS_HOST", "127.0.0.1")  # Set to 0.0.0.0 to expose /metrics.
 
 
 def load_environment():
@@ -31,18 +44,34 @@ def load_environment():
         sys.exit(-1)
 
 
-def delete_from_keystore_by_name(name):
-    log(f"[KEY DELETE] Removing {name} from keystore at {KEYSTORE_PATH}", error=False)
-    key_file_path = f"{KEYSTORE_PATH}/{name}"
+def save_timings():
+    """
+    Save the duration of every test to the results database (see api-tests/results_store.py).
 
+    Best effort: a failure here is logged and never changes the exit status of the test run.
+    """
     try:
-        shutil.rmtree(key_file_path)
-    except shutil.Error as e:
-        log(f"[KEY DELETE] Failed to delete dir: {key_file_path}\n"
-            f"Exception: {e}")
-        return
-
-    del ADDRESSES[name]
+        version_proc = subprocess.run(["hmy", "version"], env=ENVIRONMENT, capture_output=True, timeout=10)
+        version = (version_proc.stdout or version_proc.stderr).decode(errors="replace").strip()
+    except Exception:
+        version = "unknown"
+    try:  # The network id the node reports, the same query localnet_test.sh waits on.
+        response = rpc_post(NODE_URL, "net_version", json={"jsonrpc": "2.0", "method": "net_version", "params": [],
+                                                           "id": 1}, timeout=3)
+        chain_id = str(response.json()["result"])
+    except Exception:
+        chain_id = "unknown"
+    try:
+        store = ResultsStore(RESULTS_DB)
+        try:
+            store.start_run("testHmy.py", version, chain_id, NODE_URL)
+            for name, seconds in TEST_DURATIONS:
+                store.record("test", name, seconds)
+        finally:
+            store.close()
+        log(f"Timings saved to {RESULTS_DB} (run {store.run_id})", error=False)
+    except Exception as err:
+        log(f"[Warning] Could not save timings to {RESULTS_DB}: {err}")
 
 
 def get_address_from_name(name):
@@ -53,13 +82,26 @@ def get_address_from_name(name):
         return ADDRESSES.get(name, None)
 
 
+def get_address_from_keystore(name):
+    """
+    Read the address of the key directly from the keystore, avoids re-listing every key.
+    """
+    key_dir = f"{KEYSTORE_PATH}/{name}"
+    try:
+        for file_name in os.listdir(key_dir):
+            with open(f"{key_dir}/{file_name}") as f:
+                return to_one_address(bytes.fromhex(json.load(f)["address"]))
+    except (OSError, json.JSONDecodeError, KeyError, ValueError):
+        return None
+
+
 def load_addresses():
     """
     Separate function to avoid announce when loading addresses from keystore.
     """
     global ADDRESSES
     try:
-        response = subprocess.check_output(["hmy", "keys", "list"], env=ENVIRONMENT).decode()
+        response = hmy_check_output(["hmy", "keys", "list"], env=ENVIRONMENT).decode()
     except subprocess.CalledProcessError as err:
         raise RuntimeError(f"Could not list keys.\n"
                            f"\tGot exit code {err.returncode}. Msg: {err.output}") from err
@@ -83,9 +125,9 @@ def test_and_load_keystore_directory():
     """
     CRITICAL TEST
     """
-    global KEYSTORE_PATH
+    global KEYSTORE_PATH, JOURNAL
     try:
-        response = subprocess.check_output(["hmy", "keys", "location"], env=ENVIRONMENT).decode().strip()
+        response = hmy_check_output(["hmy", "keys", "location"], env=ENVIRONMENT).decode().strip()
     except subprocess.CalledProcessError as err:
         log(f"Failed: Could not get keystore path.\n"
             f"\tGot exit code {err.returncode}. Msg: {err.output}")
@@ -94,6 +136,11 @@ def test_and_load_keystore_directory():
         log(f"Failed: '{response}' is not a valid path")
         return False
     KEYSTORE_PATH = response
+    JOURNAL = KeystoreJournal(KEYSTORE_PATH)
+    reclaimed = JOURNAL.recover()
+    if reclaimed:
+        log(f"[KEY DELETE] Removed {len(reclaimed)} leftover key(s) from previous runs: {reclaimed}", error=False)
+    JOURNAL.install()
     log("Passed", error=False)
     return True
 
@@ -124,7 +171,7 @@ def test_balance():
         balance_ref = json.load(file)
     ref_key = balance_ref["key"]
     ref_min_bal = balance_ref["min_balance"]["shard_0"]
-    url = 'http://localhost:9500/'
+    url = NODE_URL
     payload = "{\n    \"jsonrpc\": \"2.0\",\n    \"method\": \"hmy_getBalance\",\n    \"params\": " \
               "[\n        \"" + ref_key + "\",\n        \"latest\"\n    ],\n    \"id\": 1\n}"
     headers = {
@@ -132,7 +179,7 @@ def test_balance():
     }
 
     try:
-        cli_response = subprocess.check_output(["hmy", "balances", ref_key], env=ENVIRONMENT).decode().strip()
+        cli_response = hmy_check_output(["hmy", "balances", ref_key], env=ENVIRONMENT).decode().strip()
     except subprocess.CalledProcessError as err:
         log(f"Failed: Could not get balance.\n"
             f"Got exit code {err.returncode}. Msg: {err.output}")
@@ -143,7 +190,7 @@ def test_balance():
         log(f"Failed: Unexpected format of cli_response. Got: {cli_response}")
         return False
 
-    response = requests.request('POST', url, headers=headers, data=payload, allow_redirects=False, timeout=3)
+    response = rpc_post(url, "hmy_getBalance", headers=headers, data=payload, timeout=3)
     body = json.loads(response.content)
     request_bal = round(int(body["result"], 16) * 10 ** -18, 6)
 
@@ -163,8 +210,9 @@ def test_balance():
 @test_announce
 def test_keys_add():
     key_name_to_add = f"random_key_{random.randint(-1e9,1e9)}"
+    JOURNAL.record(key_name_to_add)
     try:
-        subprocess.check_output(["hmy", "keys", "add", key_name_to_add], env=ENVIRONMENT).decode().strip()
+        hmy_check_output(["hmy", "keys", "add", key_name_to_add], env=ENVIRONMENT).decode().strip()
     except subprocess.CalledProcessError as err:
         log(f"Failed: Could not get keystore path.\n"
             f"\tGot exit code {err.returncode}. Msg: {err.output}")
@@ -196,19 +244,34 @@ def test_keys_mnemonics():
             return False
 
     passed = True
-    for test in sdk_mnemonics["data"]:
-        index = test["index"]
-        if index != 0:  # CLI currently uses a hardcoded index of 0.
-            continue
-
+    derived = derive_batch(sdk_mnemonics["data"])
+    for test, private_key, public_key, address in derived:
+        for field, value in (("privateKey", private_key), ("publicKey", public_key), ("addr", address)):
+            if value != test[field].lower():
+                log(f"Natively derived {field} does not match sdk's {field}. \n"
+                    f"\tMnemonic: {test['phrase']} (index {test['index']})\n"
+                    f"\tCorrect {field}: {test[field]}\n"
+                    f"\tDerived {field}: {value}")
+                passed = False
+    log(f"Derived {len(derived)} reference keys natively", error=False)
+
+    zero = [t for t in sdk_mnemonics["data"] if t["index"] == 0]
+    non_zero = [t for t in sdk_mnemonics["data"] if t["index"] != 0]
+    cli_tests = random.sample(non_zero, min(1, len(non_zero)))
+    cli_tests += random.sample(zero, min(MNEMONIC_CLI_SAMPLE_SIZE - len(cli_tests), len(zero)))
+    for test in cli_tests:
         mnemonic = test["phrase"]
         correct_address = test["addr"]
         address_name = f'testHmyAcc_{random.randint(0,1e9)}'
         while address_name in ADDRESSES:
+            metrics.RETRIES.inc("mnemonic key name")
             address_name = f'testHmyAcc_{random.randint(0,1e9)}'
 
+        JOURNAL.record(address_name)
+        start = time.perf_counter()
         try:
-            hmy = pexpect.spawn('./hmy', ['keys', 'add', address_name, '--recover', '--passphrase'], env=ENVIRONMENT)
+            hmy = pexpect.spawn('./hmy', ['keys', 'add', address_name, '--recover', '--passphrase',
+                                          f'--hd-index={test["index"]}'], env=ENVIRONMENT)
             hmy.expect("Enter passphrase\r\n")
             hmy.sendline("")
             hmy.expect("Repeat the passphrase:\r\n")
@@ -220,12 +283,14 @@ def test_keys_mnemonics():
         except pexpect.ExceptionPexpect as e:
             log(f"Exception occurred when adding a key with mnemonic."
                 f"\nException: {e}")
+            metrics.FAILURES.inc("cli", "hmy keys add --recover")
             passed = False
+        metrics.observe_timing("cli", "hmy keys add --recover", time.perf_counter() - start)
 
-        hmy_address = get_address_from_name(address_name)
+        hmy_address = get_address_from_keystore(address_name)
         if hmy_address != correct_address or hmy_address is None:
             log(f"Address does not match sdk's address. \n"
-                f"\tMnemonic: {mnemonic}\n"
+                f"\tMnemonic: {mnemonic} (index {test['index']})\n"
                 f"\tCorrect address: {correct_address}\n"
                 f"\tCLI address: {hmy_address}")
             passed = False
@@ -277,6 +342,9 @@ def test_txn_by_receipt():
 
 if __name__ == "__main__":
     load_environment()
+    if METRICS_PORT:
+        metrics.start_server(int(METRICS_PORT), METRICS_HOST)
+        log(f"Serving metrics on {METRICS_HOST}:{METRICS_PORT}/metrics", error=False)
 
     tests_results = []
     try:
@@ -299,8 +367,13 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         pass  # Stop tests but still do cleanup and report
 
-    for name in KEYS_ADDED:
-        delete_from_keystore_by_name(name)
+    if JOURNAL:
+        log(f"[KEY DELETE] Removing {len(JOURNAL.names)} key(s) from keystore at {KEYSTORE_PATH}", error=False)
+        failed = {name for name, _ in JOURNAL.cleanup()}
+        for name in KEYS_ADDED - failed:
+            ADDRESSES.pop(name, None)
+
+    save_timings()
 
     if all(tests_results):
         print(f"\nPassed {len(tests_results)} tests!\n")
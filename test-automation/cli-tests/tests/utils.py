@@ -1,6 +1,15 @@
 import inspect
 import logging
 import datetime
+import subprocess
+import time
+
+import requests
+
+import metrics  # From api-tests, put on the path by testHmy.py.
+from results_store import command_name
+
+RPC_RETRIES = 2  # Retries of an RPC request that failed to connect or timed out.
 
 
 class Colors:
@@ -34,8 +43,53 @@ def get_logger(filename):
     return log
 
 
+TEST_DURATIONS = []  # (test name, seconds) of every announced test that ran.
+
+
 def test_announce(fn):
     def wrap(*args):
         print(f"Testing {Colors.WARNING}{fn.__name__}{Colors.ENDC}")
-        return fn(*args)
+        start, passed = time.perf_counter(), False
+        try:
+            passed = fn(*args)
+            return passed
+        finally:
+            elapsed = time.perf_counter() - start
+            TEST_DURATIONS.append((fn.__name__, elapsed))
+            metrics.observe_timing("test", fn.__name__, elapsed)
+            if passed is False:
+                metrics.FAILURES.inc("test", fn.__name__)
     return wrap
+
+
+def hmy_check_output(command, **kwargs) -> bytes:
+    """
+    subprocess.check_output of a CLI command (argument list), timed per sub-command (e.g. 'hmy keys add').
+    """
+    name = command_name(" ".join(command))
+    start = time.perf_counter()
+    try:
+        return subprocess.check_output(command, **kwargs)
+    except (subprocess.SubprocessError, OSError):
+        metrics.FAILURES.inc("cli", name)
+        raise
+    finally:
+        metrics.observe_timing("cli", name, time.perf_counter() - start)
+
+
+def rpc_post(url, method, retries=RPC_RETRIES, **kwargs) -> requests.Response:
+    """
+    requests.post of a JSON-RPC `method`, timed and retried on connection errors and timeouts.
+    """
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            return requests.post(url, allow_redirects=False, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.FAILURES.inc("rpc", method)
+            if attempt == retries:
+                raise
+            metrics.RETRIES.inc(f"rpc {method}")
+            time.sleep(0.5 * 2 ** attempt)
+        finally:
+            metrics.observe_timing("rpc", method, time.perf_counter() - start)